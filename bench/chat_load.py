@@ -0,0 +1,89 @@
+"""Load /chat with many concurrent conversations against a slow fake model.
+
+    python bench/chat_load.py --chats 1000 --delay 0.5
+    python bench/chat_load.py --chats 1000 --delay 0.5 --threadpool-model
+
+Every chat opens a new session, so each also generates a title. While
+they wait on the model, GET /sessions is timed to show whether other
+requests still get served. --threadpool-model makes the model call
+block a threadpool worker, as the old sync endpoint did, for comparison.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+
+import fake_gemini
+
+
+async def run(main, chats: int, probe_after: float) -> dict[str, float]:
+    import httpx
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.lifespan(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+            await client.post("/chat", json={"session_id": "warmup", "user_input": "hello"})
+            started = time.perf_counter()
+            tasks = [
+                asyncio.create_task(
+                    client.post("/chat", json={"session_id": f"load-{i}", "user_input": "hello"})
+                )
+                for i in range(chats)
+            ]
+            await asyncio.sleep(probe_after)
+            probe_started = time.perf_counter()
+            probe = await client.get("/sessions")
+            probe_seconds = time.perf_counter() - probe_started
+            responses = await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - started
+    return {
+        "ok": sum(response.status_code == 200 for response in responses),
+        "seconds": elapsed,
+        "probe_ms": probe_seconds * 1000,
+        "probe_status": probe.status_code,
+    }
+
+
+def cli() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chats", type=int, default=1000)
+    parser.add_argument("--delay", type=float, default=0.5, help="fake model latency in seconds")
+    parser.add_argument("--backend", choices=("file", "sqlite"), default="file")
+    parser.add_argument(
+        "--threadpool-model",
+        action="store_true",
+        help="block a threadpool worker for each model call, like the old sync /chat",
+    )
+    args = parser.parse_args()
+
+    fake_gemini.install(args.delay)
+    main = fake_gemini.load_app(SESSION_BACKEND=args.backend)
+    if args.threadpool_model:
+        from fastapi.concurrency import run_in_threadpool
+
+        import gemini_client
+
+        async def blocking_response(history):
+            return await run_in_threadpool(gemini_client.get_gemini_response, history)
+
+        async def blocking_title(user_input):
+            return await run_in_threadpool(gemini_client.get_session_title, user_input)
+
+        main.get_gemini_response_async = blocking_response
+        main.get_session_title_async = blocking_title
+
+    result = asyncio.run(run(main, args.chats, probe_after=min(0.05, args.delay / 10)))
+    mode = "threadpool model calls" if args.threadpool_model else "async model calls"
+    print(
+        f"{mode}: {result['ok']}/{args.chats} chats ok in {result['seconds']:.2f}s "
+        f"({args.chats / result['seconds']:.0f}/s), GET /sessions under load "
+        f"{result['probe_ms']:.0f}ms (status {result['probe_status']})"
+    )
+    return 0 if result["ok"] == args.chats else 1
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
@@ -0,0 +1,98 @@
+"""Stress /chat with concurrent turns per session and check no turn is lost.
+
+    python bench/chat_stress.py --backend file --sessions 8 --turns 800
+
+Turns go through the ASGI app against a fake model, many at once on few
+sessions; afterwards every session must hold exactly two messages per
+turn. The store is then hit directly by threads that read, wait and
+append with ``expected_version`` but no lock: each append must either be
+stored or raise VersionConflictError, never be silently dropped.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import fake_gemini
+
+
+async def stress_chat(main, sessions: int, turns: int) -> bool:
+    import httpx
+
+    plan = [f"stress-{random.randrange(sessions)}" for _ in range(turns)]
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.lifespan(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+            started = time.perf_counter()
+            responses = await asyncio.gather(
+                *[
+                    client.post("/chat", json={"session_id": sid, "user_input": f"turn {i}"})
+                    for i, sid in enumerate(plan)
+                ]
+            )
+            elapsed = time.perf_counter() - started
+        statuses = Counter(response.status_code for response in responses)
+        expected = Counter(plan)
+        lost = {
+            sid: 2 * count - len(main.session_store.get_history(sid))
+            for sid, count in expected.items()
+        }
+    ok = statuses == Counter({200: turns}) and not any(lost.values())
+    print(f"/chat: {turns} turns on {len(expected)} sessions in {elapsed:.2f}s, statuses {dict(statuses)}")
+    print(f"  messages missing per session: {lost} -> {'OK' if ok else 'LOST UPDATES'}")
+    return ok
+
+
+def stress_store(store, writers: int, attempts: int) -> bool:
+    from session_store import VersionConflictError
+
+    conflicts = 0
+
+    def append(i: int) -> None:
+        nonlocal conflicts
+        history = store.get_history("race")
+        time.sleep(random.random() / 1000)
+        try:
+            store.append_history("race", [{"role": "user", "content": str(i)}], expected_version=len(history))
+        except VersionConflictError:
+            conflicts += 1
+
+    with ThreadPoolExecutor(writers) as pool:
+        list(pool.map(append, range(attempts)))
+    stored = len(store.get_history("race"))
+    ok = stored + conflicts == attempts
+    print(
+        f"unlocked racing appends: {attempts} attempts, {stored} stored, {conflicts} conflicts"
+        f" -> {'OK' if ok else 'SILENTLY LOST'}"
+    )
+    return ok
+
+
+def cli() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=("file", "sqlite"), default="file")
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=800)
+    parser.add_argument("--delay", type=float, default=0.005, help="fake model latency in seconds")
+    parser.add_argument("--writers", type=int, default=16)
+    args = parser.parse_args()
+
+    fake_gemini.install(args.delay)
+    main = fake_gemini.load_app(SESSION_BACKEND=args.backend)
+    ok = asyncio.run(stress_chat(main, args.sessions, args.turns))
+    store = main._create_session_store()
+    try:
+        ok = stress_store(store, args.writers, 200) and ok
+    finally:
+        store.close()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
@@ -0,0 +1,85 @@
+"""Fake Gemini backend and app setup shared by the benchmarks.
+
+The fake replaces ``generate_content`` / ``generate_content_async`` on
+``genai.GenerativeModel``, so requests go through the real client code in
+``gemini_client`` without touching the network.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import warnings
+from collections.abc import AsyncIterator
+from pathlib import Path
+from types import ModuleType
+from typing import Any
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# google-generativeai warns about its deprecation on import.
+warnings.filterwarnings("ignore", category=FutureWarning)
+import google.generativeai as genai  # noqa: E402
+
+RESPONSE = {
+    "status": "collecting",
+    "question_text": "What should the prompt be about? 🚀",
+    "ui_elements": [{"type": "radio", "options": ["( ) Blog", "( ) Code"]}],
+    "final_prompt": "",
+}
+TITLE = "Benchmark Session Title"
+CHUNK_CHARS = 16
+
+
+class _Response:
+    def __init__(self, text: str) -> None:
+        self.text = text
+
+
+def _reply_text(contents: Any) -> str:
+    # Title prompts are plain strings; chat prompts are message lists.
+    return TITLE if isinstance(contents, str) else json.dumps(RESPONSE, ensure_ascii=False)
+
+
+def install(delay: float) -> dict[str, int]:
+    """Make every model call take ``delay`` seconds; returns call counters."""
+    calls = {"sync": 0, "async": 0}
+
+    def generate_content(self: Any, contents: Any, **kwargs: Any) -> _Response:
+        calls["sync"] += 1
+        time.sleep(delay)
+        return _Response(_reply_text(contents))
+
+    async def generate_content_async(self: Any, contents: Any, stream: bool = False, **kwargs: Any) -> Any:
+        calls["async"] += 1
+        text = _reply_text(contents)
+        if not stream:
+            await asyncio.sleep(delay)
+            return _Response(text)
+
+        async def chunks() -> AsyncIterator[_Response]:
+            pieces = [text[i : i + CHUNK_CHARS] for i in range(0, len(text), CHUNK_CHARS)]
+            for piece in pieces:
+                await asyncio.sleep(delay / len(pieces))
+                yield _Response(piece)
+
+        return chunks()
+
+    genai.GenerativeModel.generate_content = generate_content
+    genai.GenerativeModel.generate_content_async = generate_content_async
+    return calls
+
+
+def load_app(**env: str) -> ModuleType:
+    """Import ``main`` with ``env`` set, serving sessions from a temp directory."""
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+    os.environ.update(env)
+    os.chdir(tempfile.mkdtemp(prefix="prompt-ai-bench-"))
+    import main
+
+    return main
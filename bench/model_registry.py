@@ -0,0 +1,83 @@
+"""Measure the per-call setup that gemini_client.get_model removes.
+
+    python bench/model_registry.py --calls 2000
+
+Compares what every call used to do, genai.configure plus a new
+GenerativeModel plus building the API client that the next
+generate_content needs after configure, with a registry lookup that
+reuses all three. No request is sent. Also checks that concurrent threads
+share one model instance.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+import fake_gemini  # noqa: F401  (puts the repo on sys.path, silences warnings)
+
+# isort: split
+import google.generativeai as genai
+from google.generativeai.client import _client_manager
+
+import gemini_client
+
+
+def per_call_us(fn, calls: int) -> float:
+    started = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def legacy_setup() -> None:
+    genai.configure(api_key=gemini_client._get_api_key())
+    genai.GenerativeModel(
+        model_name=gemini_client.CHAT_MODEL,
+        system_instruction=gemini_client.SYSTEM_INSTRUCTION,
+    )
+    _client_manager.get_default_client("generative")
+
+
+def registry_setup() -> None:
+    gemini_client._chat_model()
+    _client_manager.get_default_client("generative")
+
+
+def shared_instances(threads: int, lookups: int) -> int:
+    seen: set[int] = set()
+
+    def work() -> None:
+        for _ in range(lookups):
+            seen.add(id(gemini_client._chat_model()))
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return len(seen)
+
+
+def cli() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+    legacy = per_call_us(legacy_setup, args.calls)
+    registry_setup()  # first use builds and configures
+    registry = per_call_us(registry_setup, args.calls)
+    instances = shared_instances(args.threads, 500)
+    print(f"configure + construct + client build per call: {legacy:8.1f} us")
+    print(f"registry lookup + reused client per call:      {registry:8.1f} us")
+    print(f"model instances seen by {args.threads} threads: {instances}")
+    return 0 if instances == 1 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import threading
+import uuid
+from collections.abc import Callable
+
+
+class ChangeTracker:
+    """Count writes per session and overall, for use as HTTP ETags.
+
+    Counters live in memory and start over on every boot; a random boot id in
+    each tag keeps tags from an earlier process from matching. A session's
+    version is the global counter value at its last write, so a tag only
+    matches while nothing was written since it was handed out. Only writes
+    made by this process are seen, so it suits a store that one process owns.
+    """
+
+    def __init__(self) -> None:
+        self._boot_id = uuid.uuid4().hex[:12]
+        self._lock = threading.Lock()
+        self._version = 0
+        self._session_versions: dict[str, int] = {}
+
+    def touch(self, session_id: str) -> None:
+        """Record a write to ``session_id`` (history or metadata)."""
+        with self._lock:
+            self._version += 1
+            self._session_versions[session_id] = self._version
+
+    def etag(self) -> str:
+        """Return a tag that changes on every write to any session."""
+        with self._lock:
+            return f'"{self._boot_id}-{self._version}"'
+
+    def session_etag(self, session_id: str) -> str:
+        """Return a tag that changes on every write to ``session_id``."""
+        with self._lock:
+            return f'"{self._boot_id}-s{self._session_versions.get(session_id, 0)}"'
+
+
+
+class StoreChangeTracker:
+    """ETags built from versions kept by the store itself.
+
+    ``version`` returns the store's version of a session, or of all sessions
+    for "", so writes made by any process sharing the store change the tags.
+    """
+
+    def __init__(self, version: Callable[[str], int]) -> None:
+        self._version = version
+
+    def touch(self, session_id: str) -> None:
+        """Nothing to do; the store records its own writes."""
+
+    def etag(self) -> str:
+        return f'"db-{self._version("")}"'
+
+    def session_etag(self, session_id: str) -> str:
+        return f'"db-s{self._version(session_id)}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Return True if an ``If-None-Match`` header value matches ``etag``."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
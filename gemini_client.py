@@ -1,14 +1,19 @@
 from __future__ import annotations
 
+import hashlib
 import json
 import os
 import re
+import threading
+from collections.abc import AsyncIterator
 from pathlib import Path
 from typing import Any
 
 import google.generativeai as genai
 from dotenv import load_dotenv
 
+from json_stream import JsonObjectStream
+
 load_dotenv(dotenv_path=Path(__file__).resolve().with_name(".env"))
 
 
@@ -18,6 +23,47 @@ def _get_api_key() -> str:
         raise ValueError("GOOGLE_API_KEY is not set")
     return api_key
 
+
+_registry_lock = threading.Lock()
+_configured_api_key: str | None = None
+# (model name, system instruction, generation config as sorted JSON) -> model
+_models: dict[tuple[str, str | None, str], genai.GenerativeModel] = {}
+
+
+def get_model(
+    model_name: str,
+    system_instruction: str | None = None,
+    generation_config: dict[str, Any] | None = None,
+) -> genai.GenerativeModel:
+    """Return the shared model for this configuration, building it on first use.
+
+    ``genai.configure`` runs once per API key; changing GOOGLE_API_KEY drops
+    the cached models. Models hold no per-request state, so one instance
+    serves all threadpool workers.
+    """
+    global _configured_api_key
+    api_key = _get_api_key()
+    config = generation_config or {}
+    key = (model_name, system_instruction, json.dumps(config, sort_keys=True))
+    model = _models.get(key) if api_key == _configured_api_key else None
+    if model is not None:
+        return model
+    with _registry_lock:
+        if api_key != _configured_api_key:
+            genai.configure(api_key=api_key)
+            _configured_api_key = api_key
+            _models.clear()
+        model = _models.get(key)
+        if model is None:
+            model = genai.GenerativeModel(
+                model_name=model_name,
+                system_instruction=system_instruction,
+                generation_config=config,
+            )
+            _models[key] = model
+        return model
+
+
 SYSTEM_INSTRUCTION = (
     """
     Role: You are "Prompt Buddy," a legendary AI architect and the ultimate hype-man for creative ideas! You are an expert in Prompt Engineering and Requirement Elicitation.
@@ -106,24 +152,53 @@ def _validate_response(payload: dict[str, Any]) -> dict[str, Any]:
     }
 
 
-def get_gemini_response(history: list[dict[str, Any]]) -> dict[str, Any]:
-    """Generate the next requirement-engineering turn as strict JSON."""
-    genai.configure(api_key=_get_api_key())
-    model = genai.GenerativeModel(
-        model_name="gemini-2.5-flash",
+CHAT_MODEL = "gemini-2.5-flash"
+CHAT_GENERATION_CONFIG: dict[str, Any] = {"response_mime_type": "application/json", "temperature": 0.2}
+
+
+def _chat_model() -> genai.GenerativeModel:
+    return get_model(
+        CHAT_MODEL,
         system_instruction=SYSTEM_INSTRUCTION,
+        generation_config=CHAT_GENERATION_CONFIG,
     )
 
+
+def _chat_contents(history: list[dict[str, Any]]) -> list[dict[str, Any]]:
     prompt_history = history if isinstance(history, list) else []
-    response = model.generate_content(
-        [*prompt_history, {"role": "user", "parts": [JSON_RULES]}],
-        generation_config={
-            "response_mime_type": "application/json",
-            "temperature": 0.2,
+    return [*prompt_history, {"role": "user", "parts": [JSON_RULES]}]
+
+
+def response_cache_key(history: list[dict[str, Any]]) -> str:
+    """Hash everything that determines a chat response, for response caching.
+
+    Covers the model, system instruction, generation config and prompt. Runs
+    of whitespace in message text are collapsed first, so turns differing
+    only in spacing share a key.
+    """
+    contents = [
+        {
+            "role": message.get("role"),
+            "parts": [" ".join(str(part).split()) for part in message.get("parts", [])],
+        }
+        for message in history
+        if isinstance(message, dict)
+    ]
+    material = json.dumps(
+        {
+            "model": CHAT_MODEL,
+            "system_instruction": SYSTEM_INSTRUCTION,
+            "generation_config": CHAT_GENERATION_CONFIG,
+            "contents": _chat_contents(contents),
         },
+        ensure_ascii=False,
+        sort_keys=True,
     )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
 
-    raw_text = (response.text or "").strip()
+def _parse_response(raw_text: str) -> dict[str, Any]:
+    raw_text = raw_text.strip()
     try:
         payload = json.loads(raw_text)
     except json.JSONDecodeError:
@@ -137,16 +212,107 @@ def get_gemini_response(history: list[dict[str, Any]]) -> dict[str, Any]:
     return _validate_response(payload)
 
 
-def get_session_title(user_input: str) -> str:
-    """Generate a short (3-4 words) session title from user intent."""
-    genai.configure(api_key=_get_api_key())
-    model = genai.GenerativeModel(model_name="gemini-2.5-flash")
-    prompt = (
+def get_gemini_response(history: list[dict[str, Any]]) -> dict[str, Any]:
+    """Generate the next requirement-engineering turn as strict JSON."""
+    response = _chat_model().generate_content(_chat_contents(history))
+    return _parse_response(response.text or "")
+
+
+async def get_gemini_response_async(history: list[dict[str, Any]]) -> dict[str, Any]:
+    """Async variant of :func:`get_gemini_response`; holds no thread while waiting."""
+    response = await _chat_model().generate_content_async(_chat_contents(history))
+    return _parse_response(response.text or "")
+
+
+async def stream_gemini_response_async(
+    history: list[dict[str, Any]],
+) -> AsyncIterator[tuple[str, Any]]:
+    """Stream a turn, yielding its parts as soon as they are complete.
+
+    Yields ``("question_text", str)``, then ``("ui_element", dict)`` for each
+    UI element, then ``("final_prompt", str)``, in that order whatever order
+    the model writes them in, and finally ``("response", dict)`` with the
+    whole validated payload. Parts missing from the partial parse are taken
+    from the validated payload, so each kind is always yielded.
+    """
+    response = await _chat_model().generate_content_async(_chat_contents(history), stream=True)
+    parser = JsonObjectStream()
+    chunks: list[str] = []
+    question_sent = ui_done = final_sent = False
+    pending_elements: list[dict[str, Any]] = []
+    elements_sent = 0
+    final_prompt: str | None = None
+    async for chunk in response:
+        try:
+            text = chunk.text
+        except ValueError:  # a chunk without text parts
+            continue
+        chunks.append(text)
+        for kind, key, value in parser.feed(text):
+            if kind == "field" and key == "question_text" and isinstance(value, str):
+                question_sent = True
+                yield "question_text", value
+            elif kind == "item" and key == "ui_elements":
+                pending_elements.extend(_normalize_ui_elements([value]))
+            elif kind == "field" and key == "ui_elements":
+                ui_done = True
+            elif kind == "field" and key == "final_prompt" and isinstance(value, str):
+                final_prompt = value
+            if question_sent:
+                for element in pending_elements:
+                    yield "ui_element", element
+                elements_sent += len(pending_elements)
+                pending_elements = []
+                if ui_done and final_prompt is not None and not final_sent:
+                    final_sent = True
+                    yield "final_prompt", final_prompt
+
+    payload = _parse_response("".join(chunks))
+    if not question_sent:
+        yield "question_text", payload["question_text"]
+        for element in payload["ui_elements"]:
+            yield "ui_element", element
+    elif not ui_done:
+        for element in payload["ui_elements"][elements_sent:]:
+            yield "ui_element", element
+    if not final_sent:
+        yield "final_prompt", payload["final_prompt"]
+    yield "response", payload
+
+
+TITLE_MODEL = "gemini-2.5-flash"
+TITLE_GENERATION_CONFIG: dict[str, Any] = {"temperature": 0.0}
+
+
+def _title_model() -> genai.GenerativeModel:
+    return get_model(TITLE_MODEL, generation_config=TITLE_GENERATION_CONFIG)
+
+
+def _title_prompt(user_input: str) -> str:
+    return (
         "Summarize the user's intent in exactly 3-4 words. No punctuation.\n\n"
         f"User input: {user_input}"
     )
-    response = model.generate_content(prompt, generation_config={"temperature": 0.0})
-    raw_text = (response.text or "").strip()
+
+
+def title_cache_key(user_input: str) -> str:
+    """Hash a first message for title caching.
+
+    Case, runs of whitespace and trailing ``.!?`` are ignored. The model,
+    config and prompt template are part of the key, so changing them starts
+    a fresh cache.
+    """
+    normalized = " ".join(user_input.casefold().split()).rstrip(".!? ")
+    material = json.dumps(
+        [TITLE_MODEL, TITLE_GENERATION_CONFIG, _title_prompt(normalized)],
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _parse_title(raw_text: str) -> str:
+    raw_text = raw_text.strip()
     words = [re.sub(r"[^A-Za-z0-9]+", "", w) for w in raw_text.split()]
     words = [w for w in words if w]
     if len(words) >= 4:
@@ -154,3 +320,15 @@ def get_session_title(user_input: str) -> str:
     elif len(words) == 0:
         words = ["New", "Prompt", "Session"]
     return " ".join(words)
+
+
+def get_session_title(user_input: str) -> str:
+    """Generate a short (3-4 words) session title from user intent."""
+    response = _title_model().generate_content(_title_prompt(user_input))
+    return _parse_title(response.text or "")
+
+
+async def get_session_title_async(user_input: str) -> str:
+    """Async variant of :func:`get_session_title`."""
+    response = await _title_model().generate_content_async(_title_prompt(user_input))
+    return _parse_title(response.text or "")
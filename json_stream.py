@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import json
+from typing import Any
+
+WHITESPACE = " \t\r\n"
+
+
+class JsonObjectStream:
+    """Pick complete values out of a JSON object that arrives in pieces.
+
+    :meth:`feed` takes the next piece of text and returns the events it
+    completes:
+
+    * ``("field", key, value)`` once a top-level member's value is complete;
+    * ``("item", key, value)`` once an element of a top-level array is
+      complete, before the array's own ``field`` event.
+
+    Text before the opening brace (such as a markdown fence) and after the
+    closing one is ignored. Values are decoded with :func:`json.loads` as they
+    complete; one that does not decode is skipped rather than failing the
+    stream, since the caller validates the whole document at the end anyway.
+    """
+
+    def __init__(self) -> None:
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._done = False
+        # Top-level member being read: its key, and where its value starts.
+        self._expect_key = True
+        self._key: str | None = None
+        self._value_start: int | None = None
+        self._value_is_array = False
+        # Element of a top-level array being read.
+        self._item_start: int | None = None
+
+    @property
+    def done(self) -> bool:
+        """True once the top-level object has been closed."""
+        return self._done
+
+    def feed(self, text: str) -> list[tuple[str, str, Any]]:
+        self._text += text
+        events: list[tuple[str, str, Any]] = []
+        text = self._text
+        for i in range(self._pos, len(text)):
+            if self._done:
+                break
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    self._close_string(i, events)
+                continue
+            if self._depth == 0:
+                if c == "{":
+                    self._depth = 1
+                continue
+            if c in WHITESPACE:
+                continue
+            self._mark_start(i, c)
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+            elif c in "{[":
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+                self._close_container(i, events)
+            elif c == ",":
+                self._close_scalar(i, events)
+            elif c == ":" and self._depth == 1:
+                self._expect_key = False
+        self._pos = len(text)
+        return events
+
+    def _mark_start(self, i: int, c: str) -> None:
+        if c in ",:}]":
+            return
+        if self._depth == 1 and not self._expect_key and self._value_start is None:
+            self._value_start = i
+            self._value_is_array = c == "["
+        elif self._depth == 2 and self._value_is_array and self._item_start is None:
+            self._item_start = i
+
+    def _close_string(self, i: int, events: list[tuple[str, str, Any]]) -> None:
+        if self._depth == 1 and self._expect_key:
+            self._key = _decode(self._text[self._string_start : i + 1])
+        elif self._depth == 1 and self._value_start == self._string_start:
+            self._emit_field(i + 1, events)
+        elif self._depth == 2 and self._item_start == self._string_start:
+            self._emit_item(i + 1, events)
+
+    def _close_container(self, i: int, events: list[tuple[str, str, Any]]) -> None:
+        if self._depth == 0:
+            # Closing brace of the object itself; a scalar may end here.
+            self._close_scalar(i, events)
+            self._done = True
+        elif self._depth == 1:
+            if self._value_is_array:
+                self._close_item(i, events)
+            self._emit_field(i + 1, events)
+        elif self._depth == 2 and self._value_is_array and self._item_start is not None:
+            self._emit_item(i + 1, events)
+
+    def _close_scalar(self, i: int, events: list[tuple[str, str, Any]]) -> None:
+        if self._depth <= 1:
+            if self._value_start is not None:
+                self._emit_field(i, events)
+            self._expect_key = True
+        elif self._depth == 2 and self._value_is_array:
+            self._close_item(i, events)
+
+    def _close_item(self, i: int, events: list[tuple[str, str, Any]]) -> None:
+        if self._item_start is not None:
+            self._emit_item(i, events)
+
+    def _emit_field(self, end: int, events: list[tuple[str, str, Any]]) -> None:
+        raw = self._text[self._value_start : end]
+        self._value_start = None
+        self._value_is_array = False
+        self._item_start = None
+        if isinstance(self._key, str):
+            value = _decode(raw)
+            if value is not _INVALID:
+                events.append(("field", self._key, value))
+        self._key = None
+
+    def _emit_item(self, end: int, events: list[tuple[str, str, Any]]) -> None:
+        raw = self._text[self._item_start : end]
+        self._item_start = None
+        if isinstance(self._key, str):
+            value = _decode(raw)
+            if value is not _INVALID:
+                events.append(("item", self._key, value))
+
+
+_INVALID = object()
+
+
+def _decode(raw: str) -> Any:
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return _INVALID
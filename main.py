@@ -1,25 +1,197 @@
 from __future__ import annotations
 
+import asyncio
+import base64
+import binascii
 import json
+import logging
 import os
+import threading
 import uuid
+import zlib
+from collections.abc import AsyncIterator, Iterator
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 from json import JSONDecodeError
 from typing import Any
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
-from gemini_client import get_gemini_response, get_session_title
+from change_tracker import ChangeTracker, StoreChangeTracker, etag_matches
+from durable_io import DurableWriter
+from gemini_client import (
+    get_gemini_response_async,
+    get_session_title_async,
+    response_cache_key,
+    stream_gemini_response_async,
+    title_cache_key,
+)
+from periodic import PeriodicTask
+from response_cache import ResponseCache
+from search_index import SearchIndex
+from session_gc import SessionSweeper, delete_sessions
+from session_locks import SessionLockManager
 from session_manager import SessionManager
+from session_store import SessionStore, VersionConflictError
+from session_summary import add_turn, new_summary, summarize_history, summary_text
+from session_transfer import SessionImporter, iter_export
+from sqlite_store import SqliteSessionStore
 
 SESSIONS_DIR = "sessions"
-METADATA_FILE = os.path.join(SESSIONS_DIR, "metadata.json")
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "file").strip().lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", os.path.join(SESSIONS_DIR, "sessions.db"))
+SESSION_STORAGE_MODE = os.getenv("SESSION_STORAGE_MODE", "json").strip().lower()
+SESSION_CACHE_MAX_BYTES = int(os.getenv("SESSION_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+SESSION_ENCODING = os.getenv("SESSION_ENCODING", "pretty").strip().lower()
+SESSION_DURABILITY = os.getenv("SESSION_DURABILITY", "batch").strip().lower()
+METADATA_FLUSH_MS = int(os.getenv("METADATA_FLUSH_MS", "0"))
+SESSION_LAYOUT = os.getenv("SESSION_LAYOUT", "flat").strip().lower()
+SESSION_COLD_AFTER_DAYS = float(os.getenv("SESSION_COLD_AFTER_DAYS", "0"))
+SESSION_COMPRESSION = os.getenv("SESSION_COMPRESSION", "gzip").strip().lower()
+SESSION_TIER_INTERVAL_S = float(os.getenv("SESSION_TIER_INTERVAL_S", "3600"))
+SESSION_TTL_DAYS = float(os.getenv("SESSION_TTL_DAYS", "0"))
+SESSION_DISK_QUOTA_BYTES = int(os.getenv("SESSION_DISK_QUOTA_BYTES", "0"))
+SESSION_GC_INTERVAL_S = float(os.getenv("SESSION_GC_INTERVAL_S", "600"))
+SESSION_GC_BATCH = int(os.getenv("SESSION_GC_BATCH", "100"))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+# Sessions whose locks are held at once while /reset/bulk deletes them.
+BULK_RESET_BATCH_SIZE = 500
+SESSION_METADATA_REPAIR = os.getenv("SESSION_METADATA_REPAIR", "off").strip().lower()
+# Messages read from the store per batch while serving /history.
+HISTORY_PAGE_SIZE = 200
+TITLE_TIMEOUT_S = float(os.getenv("TITLE_TIMEOUT_S", "10"))
+TITLE_CACHE_MAX_ENTRIES = int(os.getenv("TITLE_CACHE_MAX_ENTRIES", "10000"))
+DEFAULT_TITLE = "New Session"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "0"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+RESPONSE_CACHE_TTL_S = float(os.getenv("RESPONSE_CACHE_TTL_S", "3600"))
 os.makedirs(SESSIONS_DIR, exist_ok=True)
 
-app = FastAPI(title="AI Prompt Creation API")
-session_manager = SessionManager(SESSIONS_DIR)
+
+def _create_session_store() -> SessionStore:
+    if SESSION_BACKEND == "sqlite":
+        return SqliteSessionStore(
+            SQLITE_PATH,
+            durability=SESSION_DURABILITY,
+            title_cache_max_entries=TITLE_CACHE_MAX_ENTRIES,
+        )
+    if SESSION_BACKEND == "file":
+        return SessionManager(
+            SESSIONS_DIR,
+            storage_mode=SESSION_STORAGE_MODE,
+            cache_max_bytes=SESSION_CACHE_MAX_BYTES,
+            writer=DurableWriter(SESSION_DURABILITY),
+            encoding=SESSION_ENCODING,
+            metadata_flush_interval=METADATA_FLUSH_MS / 1000,
+            layout=SESSION_LAYOUT,
+            compression=SESSION_COMPRESSION,
+            title_cache_max_entries=TITLE_CACHE_MAX_ENTRIES,
+        )
+    raise ValueError("SESSION_BACKEND must be 'file' or 'sqlite'")
+
+
+logger = logging.getLogger(__name__)
+
+session_store = _create_session_store()
+session_locks = SessionLockManager()
+session_changes = (
+    StoreChangeTracker(session_store.change_version)
+    if isinstance(session_store, SqliteSessionStore)
+    else ChangeTracker()
+)
+search_index = SearchIndex(os.path.join(SESSIONS_DIR, "search.journal"))
+response_cache = ResponseCache(
+    RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL_S
+)
+shutting_down = threading.Event()
+
+
+def _forget_session(session_id: str) -> None:
+    """Drop the derived state of a deleted session."""
+    session_changes.touch(session_id)
+    search_index.remove(session_id)
+
+
+def _backfill_search_index() -> None:
+    """Index the stored sessions the search index does not hold yet."""
+    failed = False
+    for entry in session_store.list_metadata():
+        if shutting_down.is_set():
+            return
+        session_id = entry["id"]
+        try:
+            with session_locks.lock(session_id):
+                if session_id in search_index:
+                    continue
+                summary = session_store.get_summary(session_id)
+                if summary is None:
+                    summary = summarize_history(session_store.get_history(session_id))
+                search_index.add(session_id, summary_text(summary))
+        except Exception:
+            failed = True
+            logger.warning("Could not index session %s for search", session_id, exc_info=True)
+    if not failed:
+        search_index.mark_backfilled()
+
+
+session_sweeper = SessionSweeper(
+    session_store,
+    session_locks,
+    max_age=SESSION_TTL_DAYS * 86400,
+    max_bytes=SESSION_DISK_QUOTA_BYTES,
+    batch_size=SESSION_GC_BATCH,
+    on_delete=_forget_session,
+)
+# Background maintenance started by the lifespan hook, by name.
+background_tasks: dict[str, PeriodicTask] = {}
+# Title generations that outlived their turn, kept referenced until done.
+title_tasks: set[asyncio.Task[None]] = set()
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    tasks: list[PeriodicTask] = []
+    if SESSION_TTL_DAYS > 0 or SESSION_DISK_QUOTA_BYTES > 0:
+        tasks.append(PeriodicTask("session-gc", SESSION_GC_INTERVAL_S, session_sweeper.sweep))
+    if isinstance(session_store, SessionManager):
+        if SESSION_METADATA_REPAIR == "startup":
+            logger.info("Rebuilt session metadata: %s", session_store.rebuild_metadata())
+        if session_store.layout == "sharded":
+            threading.Thread(
+                target=session_store.migrate_flat_layout, name="shard-migrator", daemon=True
+            ).start()
+        if SESSION_COLD_AFTER_DAYS > 0:
+            idle_seconds = SESSION_COLD_AFTER_DAYS * 86400
+            tasks.append(
+                PeriodicTask(
+                    "session-tiering",
+                    SESSION_TIER_INTERVAL_S,
+                    lambda: session_store.compress_idle_sessions(idle_seconds),
+                )
+            )
+    if not search_index.backfilled:
+        threading.Thread(
+            target=_backfill_search_index, name="search-backfill", daemon=True
+        ).start()
+    for task in tasks:
+        background_tasks[task.name] = task
+        task.start()
+    yield
+    shutting_down.set()
+    session_sweeper.stop()
+    for title_task in list(title_tasks):
+        title_task.cancel()
+    for task in tasks:
+        task.stop(timeout=5)
+    search_index.close()
+    session_store.close()
+
+
+app = FastAPI(title="AI Prompt Creation API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -27,6 +199,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
 
@@ -39,76 +212,30 @@ class SessionRequest(BaseModel):
     session_id: str = Field(..., min_length=1, max_length=128)
 
 
-def _now_iso() -> str:
-    return datetime.now(timezone.utc).isoformat()
-
-
-def _load_metadata() -> list[dict[str, str]]:
-    os.makedirs(SESSIONS_DIR, exist_ok=True)
-    if not os.path.exists(METADATA_FILE):
-        return []
+class BulkResetRequest(BaseModel):
+    session_ids: list[str] | None = Field(default=None, max_length=100_000)
+    # ISO 8601 timestamp; selects sessions last updated before it.
+    older_than: str | None = None
+    title_prefix: str | None = Field(default=None, min_length=1)
 
-    try:
-        with open(METADATA_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except (OSError, JSONDecodeError):
-        return []
 
-    if not isinstance(data, list):
-        return []
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
 
-    items: list[dict[str, str]] = []
-    for item in data:
-        if not isinstance(item, dict):
-            continue
-        session_id = item.get("id")
-        title = item.get("title")
-        updated_at = item.get("updated_at", "")
-        preview = item.get("preview", "")
-        if isinstance(session_id, str) and isinstance(title, str):
-            items.append(
-                {
-                    "id": session_id,
-                    "title": title,
-                    "updated_at": str(updated_at),
-                    "preview": str(preview),
-                }
-            )
-    return items
 
+def _encode_cursor(item: dict[str, str]) -> str:
+    raw = json.dumps([item["updated_at"], item["id"]], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
 
-def update_metadata(
-    session_id: str,
-    title: str,
-    updated_at: str | None = None,
-    preview: str | None = None,
-) -> None:
-    os.makedirs(SESSIONS_DIR, exist_ok=True)
-    metadata = _load_metadata()
-    updated = False
-
-    for item in metadata:
-        if item["id"] == session_id:
-            item["title"] = title
-            if updated_at is not None:
-                item["updated_at"] = updated_at
-            if preview is not None:
-                item["preview"] = preview
-            updated = True
-            break
-
-    if not updated:
-        metadata.append(
-            {
-                "id": session_id,
-                "title": title,
-                "updated_at": updated_at or "",
-                "preview": preview or "",
-            }
-        )
 
-    with open(METADATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(metadata, f, ensure_ascii=False, indent=2)
+def _decode_cursor(cursor: str) -> tuple[str, str]:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (UnicodeError, binascii.Error, JSONDecodeError) as exc:
+        raise ValueError("Malformed cursor") from exc
+    if not (isinstance(key, list) and len(key) == 2 and all(isinstance(k, str) for k in key)):
+        raise ValueError("Malformed cursor")
+    return key[0], key[1]
 
 
 def _to_gemini_history(history: list[dict[str, Any]]) -> list[dict[str, Any]]:
@@ -135,70 +262,300 @@ def _to_gemini_history(history: list[dict[str, Any]]) -> list[dict[str, Any]]:
 
 
 @app.post("/chat")
-def chat(payload: ChatRequest) -> dict[str, Any]:
+async def chat(
+    payload: ChatRequest, cache_control: str | None = Header(default=None)
+) -> dict[str, Any]:
+    # Turns of one session run one at a time so none of them is lost; other
+    # sessions are not blocked. Store I/O runs in the threadpool, but no
+    # thread is held while the model call is awaited.
+    async with session_locks.async_lock(payload.session_id):
+        turn = await _start_turn(payload)
+        try:
+            gemini_history = _to_gemini_history(turn["history"])
+            cache_key, gemini_response = _cached_response(gemini_history, cache_control)
+            if gemini_response is None:
+                gemini_response = await get_gemini_response_async(gemini_history)
+                if cache_key is not None:
+                    response_cache.put(cache_key, gemini_response)
+        except BaseException as exc:
+            _abandon_turn(turn)
+            if isinstance(exc, Exception):
+                raise HTTPException(status_code=500, detail=f"Gemini call failed: {exc}") from exc
+            raise
+        await _complete_turn(payload, turn, gemini_response)
+        return gemini_response
+
+
+@app.post("/chat/stream")
+async def chat_stream(
+    payload: ChatRequest, cache_control: str | None = Header(default=None)
+) -> StreamingResponse:
+    """Like /chat, as Server-Sent Events sent while the model is still writing.
+
+    Events: ``question_text``, one ``ui_element`` per element, ``final_prompt``
+    and, once the turn is saved, ``done`` with the whole response. A failure
+    ends the stream with an ``error`` event carrying ``status_code`` and
+    ``detail``; the turn is then not saved.
+    """
+    return StreamingResponse(
+        _iter_chat_events(payload, cache_control),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _iter_chat_events(
+    payload: ChatRequest, cache_control: str | None
+) -> AsyncIterator[bytes]:
     try:
-        is_first_message = not session_manager.session_exists(payload.session_id)
-        history = session_manager.get_history(payload.session_id)
-    except Exception as exc:
-        raise HTTPException(status_code=400, detail=str(exc)) from exc
+        async with session_locks.async_lock(payload.session_id):
+            turn = await _start_turn(payload)
+            gemini_response: dict[str, Any] | None = None
+            try:
+                gemini_history = _to_gemini_history(turn["history"])
+                cache_key, cached = _cached_response(gemini_history, cache_control)
+                if cached is not None:
+                    events = _replay_events(cached)
+                else:
+                    events = stream_gemini_response_async(gemini_history)
+                async for event, data in events:
+                    if event == "response":
+                        gemini_response = data
+                    elif event == "ui_element":
+                        yield _sse(event, data)
+                    else:
+                        yield _sse(event, {event: data})
+            except BaseException as exc:
+                # Also reached when the client disconnects mid-stream.
+                _abandon_turn(turn)
+                if isinstance(exc, Exception):
+                    raise HTTPException(
+                        status_code=500, detail=f"Gemini call failed: {exc}"
+                    ) from exc
+                raise
+            if cached is None and cache_key is not None:
+                response_cache.put(cache_key, gemini_response)
+            await _complete_turn(payload, turn, gemini_response)
+        yield _sse("done", gemini_response)
+    except HTTPException as exc:
+        yield _sse("error", {"status_code": exc.status_code, "detail": exc.detail})
+
+
+def _cached_response(
+    gemini_history: list[dict[str, Any]], cache_control: str | None
+) -> tuple[str | None, dict[str, Any] | None]:
+    """Look a turn up in the response cache.
+
+    Returns the key to store the fresh response under (None when it must
+    not be stored) and the cached response, if any. ``Cache-Control:
+    no-cache`` on the request skips the lookup; ``no-store`` skips the cache
+    entirely.
+    """
+    if not response_cache.enabled:
+        return None, None
+    directives = {d.strip().lower() for d in (cache_control or "").split(",")}
+    if "no-store" in directives:
+        return None, None
+    key = response_cache_key(gemini_history)
+    if "no-cache" in directives:
+        return key, None
+    return key, response_cache.get(key)
+
+
+async def _replay_events(gemini_response: dict[str, Any]) -> AsyncIterator[tuple[str, Any]]:
+    """Yield a complete response as the events of a streamed one."""
+    yield "question_text", gemini_response["question_text"]
+    for element in gemini_response["ui_elements"]:
+        yield "ui_element", element
+    yield "final_prompt", gemini_response["final_prompt"]
+    yield "response", gemini_response
+
+
+def _sse(event: str, data: Any) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+async def _start_turn(payload: ChatRequest) -> dict[str, Any]:
+    """Begin a turn; a first message starts its title generation alongside."""
+    turn = await run_in_threadpool(_begin_turn, payload)
+    turn["title"] = None
+    turn["title_task"] = None
+    if turn["is_first_message"]:
+        turn["title_task"] = asyncio.create_task(_generate_title(payload.user_input))
+    return turn
+
+
+async def _complete_turn(
+    payload: ChatRequest, turn: dict[str, Any], gemini_response: dict[str, Any]
+) -> None:
+    """Save the turn without waiting for a title that is not ready yet.
+
+    A title still being generated is applied by a background task once it
+    arrives.
+    """
+    title_task = turn["title_task"]
+    if title_task is not None and title_task.done():
+        turn["title"] = title_task.result()
+        title_task = None
+    try:
+        await run_in_threadpool(_finish_turn, payload, turn, gemini_response)
+    except BaseException:
+        _abandon_turn(turn)
+        raise
+    if title_task is not None:
+        task = asyncio.create_task(_apply_title(payload.session_id, title_task))
+        title_tasks.add(task)
+        task.add_done_callback(title_tasks.discard)
+
+
+def _abandon_turn(turn: dict[str, Any]) -> None:
+    if turn["title_task"] is not None:
+        turn["title_task"].cancel()
+
+
+async def _generate_title(user_input: str) -> str | None:
+    """Return the cached title for this opener, or generate and cache one."""
+    key = title_cache_key(user_input)
+    try:
+        title = await run_in_threadpool(session_store.get_cached_title, key)
+    except Exception:
+        logger.warning("Could not read the title cache", exc_info=True)
+        title = None
+    if title:
+        return title
+    try:
+        title = await asyncio.wait_for(get_session_title_async(user_input), TITLE_TIMEOUT_S)
+    except Exception:
+        return None
+    try:
+        await run_in_threadpool(session_store.save_cached_title, key, title)
+    except Exception:
+        logger.warning("Could not write the title cache", exc_info=True)
+    return title
+
+
+async def _apply_title(session_id: str, title_task: asyncio.Task[str | None]) -> None:
+    title = await title_task
+    if title:
+        await run_in_threadpool(_set_generated_title, session_id, title)
+
+
+def _set_generated_title(session_id: str, title: str) -> None:
+    """Replace the placeholder title, unless the session is gone meanwhile."""
+    with session_locks.lock(session_id):
+        existing = session_store.get_metadata(session_id)
+        if existing is None or existing["title"] != DEFAULT_TITLE:
+            return
+        session_store.update_metadata(session_id, title)
+        session_changes.touch(session_id)
+
+
+def _begin_turn(payload: ChatRequest) -> dict[str, Any]:
+    """Read what a chat turn needs and build its user message."""
+    with session_locks.lock(payload.session_id):
+        try:
+            is_first_message = not session_store.session_exists(payload.session_id)
+            history = session_store.get_history(payload.session_id)
+        except Exception as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+    version = len(history)
 
-    now = _now_iso()
     user_message = {
         "id": uuid.uuid4().hex,
         "role": "user",
         "content": payload.user_input,
         "parts": [payload.user_input],
-        "created_at": now,
+        "created_at": _now_iso(),
     }
     history.append(user_message)
+    return {
+        "history": history,
+        "version": version,
+        "user_message": user_message,
+        "is_first_message": is_first_message,
+    }
 
-    try:
-        gemini_response = get_gemini_response(_to_gemini_history(history))
-    except Exception as exc:
-        raise HTTPException(status_code=500, detail=f"Gemini call failed: {exc}") from exc
 
+def _finish_turn(payload: ChatRequest, turn: dict[str, Any], gemini_response: dict[str, Any]) -> None:
+    """Persist a completed turn; a write made since :func:`_begin_turn` is a 409."""
     assistant_content = json.dumps(gemini_response, ensure_ascii=False)
-    history.append(
-        {
-            "id": uuid.uuid4().hex,
-            "role": "assistant",
-            "content": assistant_content,
-            "parts": [assistant_content],
-            "created_at": _now_iso(),
-        }
-    )
-
-    try:
-        session_manager.save_history(payload.session_id, history)
-    except Exception as exc:
-        raise HTTPException(status_code=500, detail=f"Failed to save history: {exc}") from exc
-
-    title = "New Session"
-    metadata = _load_metadata()
-    existing = next((m for m in metadata if m["id"] == payload.session_id), None)
-    if existing is not None:
-        title = existing["title"]
+    assistant_message = {
+        "id": uuid.uuid4().hex,
+        "role": "assistant",
+        "content": assistant_content,
+        "parts": [assistant_content],
+        "created_at": _now_iso(),
+    }
 
-    if is_first_message:
+    with session_locks.lock(payload.session_id):
+        # Read under the lock so a title applied meanwhile is not overwritten.
+        title = turn["title"]
+        if title is None:
+            existing = session_store.get_metadata(payload.session_id)
+            title = existing["title"] if existing is not None else DEFAULT_TITLE
         try:
-            title = get_session_title(payload.user_input)
+            summary = session_store.get_summary(payload.session_id)
         except Exception:
-            pass
+            summary = None
+        if summary is None:
+            summary = summarize_history(turn["history"][:-1])
+        summary = add_turn(summary, payload.user_input, gemini_response)
 
-    update_metadata(
-        session_id=payload.session_id,
-        title=title,
-        updated_at=_now_iso(),
-        preview=assistant_content[:140],
-    )
-
-    return gemini_response
+        try:
+            session_store.save_turn(
+                payload.session_id,
+                [turn["user_message"], assistant_message],
+                title=title,
+                updated_at=_now_iso(),
+                preview=assistant_content[:140],
+                expected_version=turn["version"],
+                summary=summary,
+            )
+        except VersionConflictError as exc:
+            raise HTTPException(
+                status_code=409, detail=f"Session changed during the turn: {exc}"
+            ) from exc
+        except Exception as exc:
+            raise HTTPException(status_code=500, detail=f"Failed to save history: {exc}") from exc
+        finally:
+            session_changes.touch(payload.session_id)
+
+        # A session the backfill has not reached yet gets all of its turns
+        # indexed; checked under the lock, like the backfill does.
+        if payload.session_id in search_index:
+            text = " ".join(
+                [payload.user_input, gemini_response["question_text"], gemini_response["final_prompt"]]
+            )
+        else:
+            text = summary_text(summary)
+        search_index.add(payload.session_id, text)
+
+
+@app.get("/sessions", response_model=None)
+def list_sessions(
+    response: Response,
+    limit: int | None = Query(default=None, ge=1, le=500),
+    cursor: str | None = None,
+    if_none_match: str | None = Header(default=None),
+) -> list[dict[str, str]] | Response:
+    # Take the tag before reading, so a concurrent write can only make it stale.
+    etag = session_changes.etag()
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
 
+    try:
+        after = _decode_cursor(cursor) if cursor else None
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from exc
 
-@app.get("/sessions")
-def list_sessions() -> list[dict[str, str]]:
-    items = _load_metadata()
-    items.sort(key=lambda x: x.get("updated_at", ""), reverse=True)
+    # Fetch one extra entry to learn whether another page follows.
+    items = session_store.list_recent_metadata(
+        limit=None if limit is None else limit + 1, after=after
+    )
+    if limit is not None and len(items) > limit:
+        items = items[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(items[-1])
     return [
         {
             "session_id": item["id"],
@@ -210,85 +567,293 @@ def list_sessions() -> list[dict[str, str]]:
     ]
 
 
-@app.get("/history/{session_id}")
-def session_history(session_id: str) -> list[dict[str, str]]:
+def _normalize_message(msg: Any, position: int) -> dict[str, str] | None:
+    if not isinstance(msg, dict):
+        return None
+    role = str(msg.get("role", ""))
+    if role == "model":
+        role = "assistant"
+    if role not in {"user", "assistant", "system"}:
+        role = "assistant"
+
+    content = msg.get("content")
+    if not isinstance(content, str):
+        parts = msg.get("parts", [])
+        if isinstance(parts, list) and parts:
+            content = "" if parts[0] is None else str(parts[0])
+        else:
+            content = ""
+
+    msg_id = msg.get("id")
+    created_at = msg.get("created_at")
+    return {
+        "id": str(msg_id) if isinstance(msg_id, str) and msg_id else f"msg-{position+1}",
+        "role": role,
+        "content": content,
+        "created_at": str(created_at) if isinstance(created_at, str) else "",
+    }
+
+
+def _message_position(session_id: str, message_id: str) -> int:
+    position = session_store.find_message(session_id, message_id)
+    if position is None and message_id.startswith("msg-") and message_id[4:].isdigit():
+        # Messages stored without an id are exposed as msg-<1-based position>.
+        position = int(message_id[4:]) - 1
+    if position is None:
+        raise HTTPException(status_code=400, detail=f"Unknown message id: {message_id}")
+    return position
+
+
+def _history_window(
+    session_id: str, offset: int, limit: int | None, before: str | None, after: str | None
+) -> tuple[int, int | None]:
+    """Translate the /history query parameters into a [start, stop) slice."""
+    if before is None and after is None:
+        if offset < 0:
+            offset = max(0, session_store.history_length(session_id) + offset)
+        return offset, None if limit is None else offset + limit
+    if offset:
+        raise HTTPException(status_code=400, detail="offset cannot be combined with before/after")
+
+    start = 0 if after is None else _message_position(session_id, after) + 1
+    stop = None if before is None else _message_position(session_id, before)
+    if limit is not None:
+        if after is None:
+            # Page backwards from ``before``, as a chat view scrolling up does.
+            start = max(0, stop - limit)
+        else:
+            stop = start + limit if stop is None else min(stop, start + limit)
+    return start, stop
+
+
+def _iter_history(
+    session_id: str, start: int, stop: int | None, page_size: int | None = HISTORY_PAGE_SIZE
+) -> Iterator[dict[str, str]]:
+    """Yield normalized messages in [start, stop), reading ``page_size`` at a time.
+
+    A ``page_size`` of None reads the whole slice in one call.
+    """
+    position = start
+    while stop is None or position < stop:
+        size = None if stop is None else stop - position
+        if page_size is not None:
+            size = page_size if size is None else min(page_size, size)
+        page = session_store.get_history_range(session_id, position, size)
+        for msg in page:
+            normalized = _normalize_message(msg, position)
+            position += 1
+            if normalized is not None:
+                yield normalized
+        if size is None or len(page) < size:
+            return
+
+
+@app.get("/history/{session_id}", response_model=None)
+def session_history(
+    session_id: str,
+    response: Response,
+    offset: int = 0,
+    limit: int | None = Query(default=None, ge=1, le=1000),
+    before: str | None = None,
+    after: str | None = None,
+    stream: bool = False,
+    if_none_match: str | None = Header(default=None),
+) -> list[dict[str, str]] | Response:
+    """Return a session's messages, optionally a slice of them.
+
+    ``offset``/``limit`` select by position (a negative offset counts from the
+    end); ``after``/``before`` select by message id, and with ``limit`` alone
+    ``before`` returns the ``limit`` messages preceding it. ``stream=true``
+    sends the slice as NDJSON, one message per line.
+    """
+    etag = session_changes.session_etag(session_id)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
     try:
-        if not session_manager.session_exists(session_id):
+        if not session_store.session_exists(session_id):
             raise HTTPException(status_code=404, detail="Session not found")
-        history = session_manager.get_history(session_id)
+        start, stop = _history_window(session_id, offset, limit, before, after)
+        if not stream:
+            return list(_iter_history(session_id, start, stop, page_size=None))
     except HTTPException:
         raise
     except Exception as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
 
-    normalized: list[dict[str, str]] = []
-    for i, msg in enumerate(history):
-        if not isinstance(msg, dict):
-            continue
-        role = str(msg.get("role", ""))
-        if role == "model":
-            role = "assistant"
-        if role not in {"user", "assistant", "system"}:
-            role = "assistant"
-
-        content = msg.get("content")
-        if not isinstance(content, str):
-            parts = msg.get("parts", [])
-            if isinstance(parts, list) and parts:
-                content = "" if parts[0] is None else str(parts[0])
-            else:
-                content = ""
-
-        msg_id = msg.get("id")
-        created_at = msg.get("created_at")
-        normalized.append(
-            {
-                "id": str(msg_id) if isinstance(msg_id, str) and msg_id else f"msg-{i+1}",
-                "role": role,
-                "content": content,
-                "created_at": str(created_at) if isinstance(created_at, str) else "",
-            }
-        )
-
-    return normalized
+    # Backends that cannot read a slice decode the history once, not per page.
+    page_size = HISTORY_PAGE_SIZE if session_store.ranged_history_reads else None
+    return StreamingResponse(
+        (
+            json.dumps(msg, ensure_ascii=False) + "\n"
+            for msg in _iter_history(session_id, start, stop, page_size)
+        ),
+        media_type="application/x-ndjson",
+        headers={"ETag": etag},
+    )
 
 
 @app.post("/reset")
 def reset(payload: SessionRequest) -> dict[str, Any]:
-    try:
-        deleted = session_manager.delete_history(payload.session_id)
-    except Exception as exc:
-        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    with session_locks.lock(payload.session_id):
+        try:
+            deleted = session_store.delete_history(payload.session_id)
+        except Exception as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        finally:
+            session_changes.touch(payload.session_id)
 
-    metadata = [item for item in _load_metadata() if item.get("id") != payload.session_id]
-    os.makedirs(SESSIONS_DIR, exist_ok=True)
-    with open(METADATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(metadata, f, ensure_ascii=False, indent=2)
+        session_store.delete_metadata(payload.session_id)
+        _forget_session(payload.session_id)
 
     return {"session_id": payload.session_id, "reset": deleted}
 
 
+@app.post("/reset/bulk")
+def bulk_reset(payload: BulkResetRequest) -> dict[str, Any]:
+    """Reset many sessions: the given ids, narrowed by any filters given."""
+    if payload.session_ids is None and payload.older_than is None and payload.title_prefix is None:
+        raise HTTPException(
+            status_code=400, detail="Give session_ids, older_than or title_prefix"
+        )
+    cutoff = None
+    if payload.older_than is not None:
+        try:
+            older_than = datetime.fromisoformat(payload.older_than)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail="older_than must be an ISO 8601 timestamp") from exc
+        if older_than.tzinfo is None:
+            older_than = older_than.replace(tzinfo=timezone.utc)
+        # Same format as the stored updated_at values, so strings compare in time order.
+        cutoff = older_than.astimezone(timezone.utc).isoformat()
+
+    def selected(session_id: str) -> bool:
+        item = session_store.get_metadata(session_id)
+        if item is None:
+            return (
+                cutoff is None
+                and payload.title_prefix is None
+                and session_store.session_exists(session_id)
+            )
+        if cutoff is not None and not "" < item["updated_at"] < cutoff:
+            return False
+        return payload.title_prefix is None or item["title"].startswith(payload.title_prefix)
+
+    if payload.session_ids is not None:
+        session_ids = payload.session_ids
+    else:
+        session_ids = [item["id"] for item in session_store.list_metadata()]
+
+    deleted: list[str] = []
+    reclaimed = 0
+    try:
+        for start in range(0, len(session_ids), BULK_RESET_BATCH_SIZE):
+            batch = session_ids[start : start + BULK_RESET_BATCH_SIZE]
+            batch_deleted, batch_bytes = delete_sessions(
+                session_store, session_locks, batch, should_delete=selected
+            )
+            for session_id in batch_deleted:
+                _forget_session(session_id)
+            deleted.extend(batch_deleted)
+            reclaimed += batch_bytes
+    except Exception as exc:
+        raise HTTPException(
+            status_code=500, detail=f"Bulk reset failed after {len(deleted)} sessions: {exc}"
+        ) from exc
+
+    return {"reset": len(deleted), "bytes": reclaimed, "session_ids": deleted}
+
+
 @app.get("/summary/{session_id}")
 def summary(session_id: str) -> dict[str, Any]:
     try:
-        history = session_manager.get_history(session_id)
+        stored = session_store.get_summary(session_id)
+        if stored is None:
+            # Sessions stored before summaries existed get one built once.
+            with session_locks.lock(session_id):
+                history = session_store.get_history(session_id)
+                stored = summarize_history(history) if history else new_summary()
+                if history:
+                    session_store.save_summary(session_id, stored)
     except Exception as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
 
-    user_answers: list[str] = []
-    for message in history:
-        if not isinstance(message, dict):
-            continue
-        if message.get("role") != "user":
-            continue
-        content = message.get("content")
-        if isinstance(content, str):
-            user_answers.append(content)
+    return {
+        "session_id": session_id,
+        "user_answers": stored["user_answers"],
+        "qa_pairs": stored["qa_pairs"],
+        "status": stored["status"],
+        "final_prompt": stored["final_prompt"],
+    }
+
+
+@app.get("/search")
+def search(
+    q: str = Query(..., min_length=1, max_length=500),
+    limit: int = Query(default=20, ge=1, le=100),
+) -> list[dict[str, Any]]:
+    results: list[dict[str, Any]] = []
+    for session_id, score in search_index.search(q, limit):
+        item = session_store.get_metadata(session_id)
+        if item is None:
             continue
-        parts = message.get("parts", [])
-        if isinstance(parts, list) and parts:
-            user_answers.append("" if parts[0] is None else str(parts[0]))
-        else:
-            user_answers.append("")
+        results.append(
+            {
+                "session_id": session_id,
+                "title": item["title"],
+                "updated_at": item.get("updated_at", ""),
+                "preview": item.get("preview", ""),
+                "score": round(score, 4),
+            }
+        )
+    return results
+
+
+@app.get("/export")
+def export_sessions() -> StreamingResponse:
+    """Stream every session as gzip-compressed NDJSON."""
+    return StreamingResponse(
+        iter_export(session_store),
+        media_type="application/gzip",
+        headers={"Content-Disposition": 'attachment; filename="sessions.ndjson.gz"'},
+    )
+
+
+def _reindex_imported(session_id: str, history: list[dict[str, Any]]) -> None:
+    _forget_session(session_id)
+    search_index.add(session_id, summary_text(summarize_history(history)))
+
 
-    return {"session_id": session_id, "user_answers": user_answers}
+@app.post("/import")
+async def import_sessions(request: Request) -> dict[str, int]:
+    """Load an /export stream from the request body, replacing sessions with the same id."""
+    importer = SessionImporter(
+        session_store,
+        batch_size=IMPORT_BATCH_SIZE,
+        locks=session_locks,
+        on_session=_reindex_imported,
+    )
+    try:
+        async for chunk in request.stream():
+            await run_in_threadpool(importer.feed, chunk)
+        return await run_in_threadpool(importer.finish)
+    except zlib.error as exc:
+        raise HTTPException(status_code=400, detail=f"Body is not a gzip export: {exc}") from exc
+    except Exception as exc:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Import failed after {importer.sessions} sessions: {exc}",
+        ) from exc
+
+
+@app.get("/stats")
+def stats() -> dict[str, Any]:
+    return {
+        "history_cache": session_store.cache_stats(),
+        "response_cache": response_cache.stats(),
+        "background_tasks": {
+            name: {"runs": task.runs, "last_result": task.last_result}
+            for name, task in background_tasks.items()
+        },
+    }
@@ -0,0 +1,230 @@
+"""Offline maintenance commands for the sessions directory.
+
+Run with the API stopped, e.g.:
+
+    python manage.py migrate-encoding --encoding compact --workers 8
+    python manage.py shard
+    python manage.py tier --idle-days 30 --compression zstd
+    python manage.py rebuild-metadata --workers 8
+    python manage.py export --output sessions.ndjson.gz
+    python manage.py import --input sessions.ndjson.gz --sqlite sessions/sessions.db
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from durable_io import DurableWriter
+from search_index import SearchIndex
+from session_codec import COLD_SUFFIXES, ENCODINGS, SessionCodec
+from session_manager import LAYOUTS, SessionManager, detect_layout, iter_session_files
+from session_store import SessionStore
+from session_summary import summarize_history, summary_text
+from session_transfer import SessionImporter, iter_export
+from sqlite_store import SqliteSessionStore
+
+
+def migrate_session_file(path: str, encoding: str) -> tuple[int, int]:
+    """Re-encode one session file; returns its size before and after."""
+    codec = SessionCodec(encoding)
+    writer = DurableWriter("none")
+    source = Path(path)
+    if source.name.endswith(tuple(COLD_SUFFIXES.values())):
+        # Cold sessions are re-encoded when they are promoted on their next write.
+        size = source.stat().st_size
+        return size, size
+
+    data = source.read_bytes()
+    if source.suffix == ".jsonl":
+        # Logs stay logs; rewriting them also compacts them to one record.
+        new_data = codec.encode_record(codec.decode_log(data))
+        writer.write_atomic(source, new_data)
+        return len(data), len(new_data)
+
+    if codec.is_current(data, source.suffix):
+        return len(data), len(data)
+    new_data = codec.encode(codec.decode(data, source.suffix))
+    target = source.with_suffix(codec.snapshot_suffix)
+    writer.write_atomic(target, new_data)
+    if target != source:
+        source.unlink()
+    return len(data), len(new_data)
+
+
+def migrate_encoding(sessions_dir: Path, encoding: str, workers: int | None = None) -> dict[str, float]:
+    """Convert every session file under ``sessions_dir`` to ``encoding`` in parallel."""
+    SessionCodec(encoding)  # Fail fast on an unusable encoding.
+    paths = [str(path) for path in iter_session_files(sessions_dir)]
+    started = time.perf_counter()
+    bytes_before = bytes_after = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for before, after in pool.map(
+            migrate_session_file, paths, [encoding] * len(paths), chunksize=64
+        ):
+            bytes_before += before
+            bytes_after += after
+    return {
+        "files": len(paths),
+        "bytes_before": bytes_before,
+        "bytes_after": bytes_after,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def export_sessions(store: SessionStore, output: Path) -> dict[str, float]:
+    started = time.perf_counter()
+    size = 0
+    counts: dict[str, int] = {}
+    with output.open("wb") as f:
+        for chunk in iter_export(store, report=counts):
+            f.write(chunk)
+            size += len(chunk)
+    return {**counts, "bytes": size, "seconds": round(time.perf_counter() - started, 3)}
+
+
+def import_sessions(
+    store: SessionStore, source: Path, batch_size: int, search_index: SearchIndex | None = None
+) -> dict[str, float]:
+    def reindex(session_id: str, history: list) -> None:
+        search_index.remove(session_id)
+        search_index.add(session_id, summary_text(summarize_history(history)))
+
+    started = time.perf_counter()
+    importer = SessionImporter(
+        store, batch_size=batch_size, on_session=reindex if search_index is not None else None
+    )
+    with source.open("rb") as f:
+        while chunk := f.read(1 << 20):
+            importer.feed(chunk)
+    report: dict[str, float] = dict(importer.finish())
+    seconds = time.perf_counter() - started
+    report["seconds"] = round(seconds, 3)
+    report["sessions_per_second"] = round(report["sessions"] / seconds, 1) if seconds else 0.0
+    return report
+
+
+def _layout(args: argparse.Namespace) -> str:
+    """The --layout given, or the one the sessions directory already uses."""
+    return args.layout or detect_layout(args.sessions_dir)
+
+
+def _open_store(args: argparse.Namespace) -> SessionStore:
+    if args.sqlite is not None:
+        return SqliteSessionStore(args.sqlite, durability="none")
+    return SessionManager(args.sessions_dir, writer=DurableWriter("batch"), layout=_layout(args))
+
+
+LAYOUT_HELP = "Session file layout (default: detected from the sessions directory)"
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions-dir", type=Path, default=Path("sessions"))
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate = commands.add_parser(
+        "migrate-encoding", help="Convert all session files to another encoding"
+    )
+    migrate.add_argument("--encoding", choices=ENCODINGS, required=True)
+    migrate.add_argument("--workers", type=int, default=os.cpu_count())
+
+    commands.add_parser("shard", help="Move flat-layout session files into shard directories")
+
+    tier = commands.add_parser("tier", help="Compress sessions that have been idle for a while")
+    tier.add_argument("--idle-days", type=float, required=True)
+    tier.add_argument("--compression", choices=list(COLD_SUFFIXES), default="gzip")
+    tier.add_argument("--layout", choices=LAYOUTS, help=LAYOUT_HELP)
+
+    rebuild = commands.add_parser(
+        "rebuild-metadata", help="Rebuild session metadata from the histories and drop orphans"
+    )
+    rebuild.add_argument("--workers", type=int, default=os.cpu_count())
+
+    export = commands.add_parser("export", help="Write all sessions as gzip-compressed NDJSON")
+    export.add_argument("--output", type=Path, required=True)
+    export.add_argument("--sqlite", type=Path, help="Read from this SQLite database instead")
+    export.add_argument("--layout", choices=LAYOUTS, help=LAYOUT_HELP)
+
+    load = commands.add_parser("import", help="Load an export, replacing sessions with the same id")
+    load.add_argument("--input", type=Path, required=True)
+    load.add_argument("--sqlite", type=Path, help="Write to this SQLite database instead")
+    load.add_argument("--batch-size", type=int, default=500)
+    load.add_argument("--layout", choices=LAYOUTS, help=LAYOUT_HELP)
+
+    args = parser.parse_args(argv)
+    if args.command == "migrate-encoding":
+        report = migrate_encoding(args.sessions_dir, args.encoding, args.workers)
+        print(
+            f"Migrated {report['files']} files in {report['seconds']}s: "
+            f"{report['bytes_before']} -> {report['bytes_after']} bytes"
+        )
+    elif args.command == "shard":
+        store = SessionManager(args.sessions_dir, layout="sharded")
+        try:
+            moved = store.migrate_flat_layout()
+        finally:
+            store.close()
+        print(f"Moved {moved} session files into the sharded layout")
+    elif args.command == "tier":
+        store = SessionManager(args.sessions_dir, layout=_layout(args), compression=args.compression)
+        try:
+            report = store.compress_idle_sessions(args.idle_days * 86400)
+        finally:
+            store.close()
+        print(
+            f"Compressed {report['sessions']} sessions: "
+            f"{report['bytes_before']} -> {report['bytes_after']} bytes"
+        )
+    elif args.command == "rebuild-metadata":
+        store = SessionManager(args.sessions_dir)
+        try:
+            report = store.rebuild_metadata(args.workers)
+        finally:
+            store.close()
+        print(
+            f"Scanned {report['sessions']} sessions in {report['seconds']}s "
+            f"({report['sessions_per_second']}/s): {report['created']} created, "
+            f"{report['updated']} updated, {report['removed']} orphaned entries removed, "
+            f"{report['unreadable']} unreadable"
+        )
+    elif args.command == "export":
+        store = _open_store(args)
+        try:
+            report = export_sessions(store, args.output)
+        finally:
+            store.close()
+        print(
+            f"Exported {report['sessions']} sessions ({report['bytes']} bytes) "
+            f"in {report['seconds']}s"
+        )
+        if report["missing_history"] or report["unreadable"]:
+            print(
+                f"error: {report['missing_history']} metadata entries have no readable history "
+                f"and {report['unreadable']} other histories are unreadable; they are not in "
+                "the export. Check --layout, or run rebuild-metadata to drop orphaned entries.",
+                file=sys.stderr,
+            )
+            return 1
+    elif args.command == "import":
+        store = _open_store(args)
+        search_index = SearchIndex(args.sessions_dir / "search.journal")
+        try:
+            report = import_sessions(store, args.input, args.batch_size, search_index)
+        finally:
+            search_index.close()
+            store.close()
+        print(
+            f"Imported {report['sessions']} sessions ({report['messages']} messages, "
+            f"{report['skipped']} skipped) in {report['seconds']}s "
+            f"({report['sessions_per_second']}/s)"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,366 @@
+from __future__ import annotations
+
+import bisect
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import IO
+
+from durable_io import DurableWriter
+
+logger = logging.getLogger(__name__)
+
+
+class MetadataStore:
+    """Session metadata indexed by session id and persisted as a journal.
+
+    Entries live in an in-memory dict, so lookups, upserts and deletes are O(1).
+    A list of ``(updated_at, id)`` keys and a list of ids are kept sorted as
+    entries change, so pages of the most recently updated sessions, and pages
+    in id order, are served without sorting.
+    Every change appends one JSON line to the journal file instead of
+    rewriting all entries. On load the journal is replayed and a torn final
+    line left by a crash is truncated away. Once the journal holds more than
+    twice as many records as live entries (and at least ``compact_min_records``)
+    it is rewritten through a temp file and an atomic rename. Appends are made
+    durable by ``writer`` outside the store lock, so concurrent updates share
+    its group commits.
+
+    With a positive ``flush_interval`` (seconds) the store is write-behind:
+    changes update the index at once, but their journal records are coalesced
+    per session and written by a background thread every ``flush_interval``
+    or as soon as ``flush_max_pending`` sessions are waiting. :meth:`close`
+    flushes whatever is still pending.
+
+    A legacy ``metadata.json`` list is imported while the journal is missing
+    or empty.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        legacy_path: str | Path | None = None,
+        compact_min_records: int = 1024,
+        writer: DurableWriter | None = None,
+        flush_interval: float = 0.0,
+        flush_max_pending: int = 256,
+    ) -> None:
+        self.path = Path(path)
+        self._writer = writer or DurableWriter("none")
+        self.legacy_path = Path(legacy_path) if legacy_path is not None else None
+        self.compact_min_records = max(1, compact_min_records)
+        self.flush_interval = max(0.0, flush_interval)
+        self.flush_max_pending = max(1, flush_max_pending)
+        self.flushes = 0
+        self._entries: dict[str, dict[str, str]] = {}
+        self._recent: list[tuple[str, str]] = []
+        self._ids: list[str] = []
+        # Journal records not written yet, at most one per session (write-behind).
+        self._pending: dict[str, dict] = {}
+        self._records = 0
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._closed = False
+        self._file: IO[bytes] | None = None
+        self._load()
+        self._flusher: threading.Thread | None = None
+        if self.flush_interval > 0:
+            self._flusher = threading.Thread(
+                target=self._run_flusher, name="metadata-flusher", daemon=True
+            )
+            self._flusher.start()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, session_id: str) -> dict[str, str] | None:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            return None if entry is None else dict(entry)
+
+    def items(self) -> list[dict[str, str]]:
+        with self._lock:
+            return [dict(entry) for entry in self._entries.values()]
+
+    def page(
+        self, limit: int | None = None, after: tuple[str, str] | None = None
+    ) -> list[dict[str, str]]:
+        """Return entries newest first, starting below the ``(updated_at, id)`` key ``after``."""
+        with self._lock:
+            end = len(self._recent) if after is None else bisect.bisect_left(self._recent, after)
+            start = 0 if limit is None else max(0, end - limit)
+            return [
+                dict(self._entries[session_id])
+                for _, session_id in reversed(self._recent[start:end])
+            ]
+
+    def page_by_id(self, limit: int | None = None, after: str | None = None) -> list[dict[str, str]]:
+        """Return entries in id order, starting above the id ``after``."""
+        with self._lock:
+            start = 0 if after is None else bisect.bisect_right(self._ids, after)
+            end = len(self._ids) if limit is None else start + limit
+            return [dict(self._entries[session_id]) for session_id in self._ids[start:end]]
+
+    def upsert(
+        self,
+        session_id: str,
+        title: str,
+        updated_at: str | None = None,
+        preview: str | None = None,
+    ) -> None:
+        """Create or update an entry; None leaves a field unchanged."""
+        with self._lock:
+            previous = self._entries.get(session_id)
+            if previous is None:
+                entry = {"id": session_id, "title": title, "updated_at": "", "preview": ""}
+            else:
+                entry = dict(previous)
+                entry["title"] = title
+            if updated_at is not None:
+                entry["updated_at"] = updated_at
+            if preview is not None:
+                entry["preview"] = preview
+            fd = self._record(session_id, {"op": "put", "entry": entry})
+            self._entries[session_id] = entry
+            if previous is None:
+                bisect.insort(self._ids, session_id)
+            if previous is None or previous["updated_at"] != entry["updated_at"]:
+                if previous is not None:
+                    self._unindex(previous)
+                bisect.insort(self._recent, (entry["updated_at"], session_id))
+            self._maybe_compact()
+        if fd is not None:
+            self._writer.sync_fd(fd)
+
+    def upsert_many(self, entries: list[dict[str, str]]) -> None:
+        """Create or replace several complete entries with one journal write."""
+        if not entries:
+            return
+        with self._lock:
+            fd = None
+            records = [{"op": "put", "entry": dict(entry)} for entry in entries]
+            if self.flush_interval > 0 and not self._closed:
+                for record in records:
+                    self._record(record["entry"]["id"], record)
+            else:
+                fd = self._append(records)
+            for record in records:
+                self._entries[record["entry"]["id"]] = record["entry"]
+            # Re-sorting once beats an insertion per entry for large batches.
+            self._reindex()
+            self._maybe_compact()
+        if fd is not None:
+            self._writer.sync_fd(fd)
+
+    def delete(self, session_id: str) -> bool:
+        """Delete an entry. Returns True if deleted, False if absent."""
+        with self._lock:
+            if session_id not in self._entries:
+                return False
+            fd = self._record(session_id, {"op": "del", "id": session_id})
+            self._unindex(self._entries.pop(session_id))
+            del self._ids[bisect.bisect_left(self._ids, session_id)]
+            self._maybe_compact()
+        if fd is not None:
+            self._writer.sync_fd(fd)
+        return True
+
+    def delete_many(self, session_ids: list[str]) -> int:
+        """Delete several entries with one journal write. Returns how many existed."""
+        with self._lock:
+            removed = {session_id for session_id in session_ids if session_id in self._entries}
+            if not removed:
+                return 0
+            fd = None
+            if self.flush_interval > 0 and not self._closed:
+                for session_id in removed:
+                    self._record(session_id, {"op": "del", "id": session_id})
+            else:
+                fd = self._append([{"op": "del", "id": session_id} for session_id in removed])
+            for session_id in removed:
+                del self._entries[session_id]
+            # One pass over the index instead of a list deletion per entry.
+            self._recent = [key for key in self._recent if key[1] not in removed]
+            self._ids = [session_id for session_id in self._ids if session_id not in removed]
+            self._maybe_compact()
+        if fd is not None:
+            self._writer.sync_fd(fd)
+        return len(removed)
+
+    def compact(self) -> None:
+        """Rewrite the journal so it holds one record per live entry."""
+        with self._lock:
+            self._compact()
+
+    def flush(self) -> None:
+        """Write and sync all pending write-behind records."""
+        with self._lock:
+            fd = self._flush_pending()
+        if fd is not None:
+            self._writer.sync_fd(fd)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def close(self) -> None:
+        """Stop the flusher, write pending records and close the journal."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _record(self, session_id: str, record: dict) -> int | None:
+        """Write a change now, or queue it for the flusher in write-behind mode."""
+        if self.flush_interval > 0 and not self._closed:
+            self._pending[session_id] = record
+            if len(self._pending) >= self.flush_max_pending:
+                self._cond.notify_all()
+            return None
+        return self._append([record])
+
+    def _flush_pending(self) -> int | None:
+        if not self._pending:
+            return None
+        fd = self._append(list(self._pending.values()))
+        self._pending.clear()
+        self.flushes += 1
+        self._maybe_compact()
+        return fd
+
+    def _run_flusher(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._closed or len(self._pending) >= self.flush_max_pending,
+                    timeout=self.flush_interval,
+                )
+                if self._closed:
+                    return
+                try:
+                    fd = self._flush_pending()
+                except OSError:
+                    # Records stay pending and are retried on the next tick.
+                    logger.exception("Failed to flush session metadata")
+                    continue
+            if fd is not None:
+                self._writer.sync_fd(fd)
+
+    def _load(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            self._entries = self._read_legacy()
+            self._reindex()
+            self._compact()
+            return
+
+        valid_size = 0
+        with self.path.open("rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                valid_size += len(line)
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if not isinstance(record, dict):
+                    continue
+                self._apply(record)
+                self._records += 1
+
+        if valid_size < self.path.stat().st_size:
+            # Drop the torn tail so new records start on a clean line.
+            with self.path.open("r+b") as f:
+                f.truncate(valid_size)
+        self._reindex()
+        self._file = self.path.open("ab")
+
+    def _apply(self, record: dict) -> None:
+        op = record.get("op")
+        if op == "put":
+            entry = _clean_entry(record.get("entry"))
+            if entry is not None:
+                self._entries[entry["id"]] = entry
+        elif op == "del":
+            self._entries.pop(str(record.get("id")), None)
+
+    def _reindex(self) -> None:
+        self._recent = sorted((entry["updated_at"], entry["id"]) for entry in self._entries.values())
+        self._ids = sorted(self._entries)
+
+    def _unindex(self, entry: dict[str, str]) -> None:
+        key = (entry["updated_at"], entry["id"])
+        index = bisect.bisect_left(self._recent, key)
+        if index < len(self._recent) and self._recent[index] == key:
+            del self._recent[index]
+
+    def _read_legacy(self) -> dict[str, dict[str, str]]:
+        if self.legacy_path is None or not self.legacy_path.exists():
+            return {}
+        try:
+            with self.legacy_path.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+        if not isinstance(data, list):
+            return {}
+
+        entries: dict[str, dict[str, str]] = {}
+        for item in data:
+            entry = _clean_entry(item)
+            if entry is not None:
+                entries[entry["id"]] = entry
+        return entries
+
+    def _append(self, records: list[dict]) -> int:
+        """Append records and return a duplicate descriptor for syncing them."""
+        if self._file is None:
+            self._file = self.path.open("ab")
+        self._file.write(b"".join(_encode(record) for record in records))
+        self._file.flush()
+        self._records += len(records)
+        return os.dup(self._file.fileno())
+
+    def _maybe_compact(self) -> None:
+        if self._records > max(self.compact_min_records, 2 * len(self._entries)):
+            self._compact()
+
+    def _compact(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        data = b"".join(_encode({"op": "put", "entry": entry}) for entry in self._entries.values())
+        self._writer.write_atomic(self.path, data)
+        # The snapshot already reflects every queued change.
+        self._pending.clear()
+        self._records = len(self._entries)
+        self._file = self.path.open("ab")
+
+
+def _encode(record: dict) -> bytes:
+    return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def _clean_entry(item: object) -> dict[str, str] | None:
+    if not isinstance(item, dict):
+        return None
+    session_id = item.get("id")
+    title = item.get("title")
+    if not isinstance(session_id, str) or not isinstance(title, str):
+        return None
+    return {
+        "id": session_id,
+        "title": title,
+        "updated_at": str(item.get("updated_at", "")),
+        "preview": str(item.get("preview", "")),
+    }
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import logging
+import threading
+from collections.abc import Callable
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    """Run ``func`` on a daemon thread every ``interval`` seconds until stopped.
+
+    The first run starts immediately. Exceptions are logged and the task keeps
+    its schedule, so a transient disk error does not end background
+    maintenance.
+    """
+
+    def __init__(self, name: str, interval: float, func: Callable[[], Any]) -> None:
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.runs = 0
+        self.last_result: Any = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.last_result = self.func()
+                self.runs += 1
+            except Exception:
+                logger.exception("Periodic task %s failed", self.name)
+            self._stop.wait(self.interval)
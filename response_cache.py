@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+
+class ResponseCache:
+    """Thread-safe LRU cache of model responses with a time to live.
+
+    Entries are stored as encoded JSON, so every hit returns a fresh copy and
+    sizes count real bytes. The cache is bounded by ``max_entries`` and
+    ``max_bytes``; entries older than ``ttl`` seconds count as misses and are
+    dropped. A ``max_entries`` of 0 disables caching.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float) -> None:
+        self.max_entries = max(0, max_entries)
+        self.max_bytes = max(0, max_bytes)
+        self.ttl = max(0.0, ttl)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        # key -> (encoded response, expiry on the monotonic clock)
+        self._entries: OrderedDict[str, tuple[bytes, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        """Return a copy of the cached response, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                self._remove(key)
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            data = entry[0]
+        return json.loads(data)
+
+    def put(self, key: str, response: dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        data = json.dumps(response, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        with self._lock:
+            self._remove(key)
+            if len(data) > self.max_bytes:
+                return
+            self._entries[key] = (data, time.monotonic() + self.ttl)
+            self.total_bytes += len(data)
+            while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self.total_bytes -= len(evicted)
+                self.evictions += 1
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= len(entry[0])
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import heapq
+import json
+import logging
+import math
+import re
+import threading
+from collections import Counter
+from itertools import islice
+from pathlib import Path
+from typing import IO
+
+from durable_io import DurableWriter
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"\w\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into lowercase word tokens of at least two characters."""
+    return TOKEN_RE.findall(text.lower())
+
+
+class SearchIndex:
+    """In-memory inverted index over session text, ranked with BM25.
+
+    Each session is one document; :meth:`add` extends it with more text, so a
+    chat turn only tokenizes its own text. Postings map a term to the term
+    frequency in every session containing it, which makes a query cost
+    proportional to the postings of its terms rather than to the number of
+    sessions.
+
+    Changes are appended to a journal (term counts, not raw text) that is
+    replayed on startup and rewritten once it holds more than twice as many
+    records as documents. The index is derived data, so journal writes are
+    not fsynced; a lost tail only makes recent turns unsearchable until the
+    session is written again or the index is rebuilt. :meth:`mark_backfilled`
+    records that every stored session has been indexed, so an interrupted
+    backfill is resumed on the next start.
+    """
+
+    k1 = 1.2
+    b = 0.75
+    common_fraction = 0.05
+    common_min_postings = 1000
+
+    def __init__(self, path: str | Path | None = None, compact_min_records: int = 1024) -> None:
+        self.path = Path(path) if path is not None else None
+        self.compact_min_records = max(1, compact_min_records)
+        self._postings: dict[str, dict[str, int]] = {}
+        self._doc_terms: dict[str, Counter[str]] = {}
+        self._doc_lengths: dict[str, int] = {}
+        self._total_length = 0
+        self._records = 0
+        self._lock = threading.Lock()
+        self._file: IO[bytes] | None = None
+        self.backfilled = False
+        if self.path is not None and self.path.exists():
+            self._load()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._doc_lengths)
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._doc_lengths
+
+    def add(self, session_id: str, text: str) -> None:
+        """Append ``text`` to the document of ``session_id``."""
+        terms = Counter(tokenize(text))
+        if not terms:
+            return
+        with self._lock:
+            self._apply_add(session_id, terms)
+            self._append({"op": "add", "id": session_id, "terms": terms})
+
+    def remove(self, session_id: str) -> None:
+        with self._lock:
+            if session_id in self._doc_terms:
+                self._apply_remove(session_id)
+                self._append({"op": "del", "id": session_id})
+
+    def mark_backfilled(self) -> None:
+        with self._lock:
+            if not self.backfilled:
+                self.backfilled = True
+                self._append({"op": "backfilled"})
+
+    def search(self, query: str, limit: int = 20) -> list[tuple[str, float]]:
+        """Return up to ``limit`` ``(session_id, score)`` pairs, best first.
+
+        Terms found in more than ``common_fraction`` of all sessions add
+        little to a BM25 score, so they are only scored for sessions matched
+        by a rarer query term. A query made of common terms alone only scores
+        the ``common`` sessions whose text most recently contained its rarest
+        term (postings are kept in that order), which keeps its cost bounded.
+        """
+        with self._lock:
+            count = len(self._doc_lengths)
+            postings_by_term = [
+                postings for term in set(tokenize(query)) if (postings := self._postings.get(term))
+            ]
+            if not postings_by_term:
+                return []
+            postings_by_term.sort(key=len)
+            # BM25 term weight: idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len / avg_len))
+            base = self.k1 * (1 - self.b)
+            scale = self.k1 * self.b * count / self._total_length
+            lengths = self._doc_lengths
+            common = max(self.common_min_postings, int(count * self.common_fraction))
+
+            scores: dict[str, float] = {}
+            for i, postings in enumerate(postings_by_term):
+                boost = self.k1 + 1
+                boost *= math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                if i == 0 or len(postings) <= common:
+                    items = postings.items()
+                    if len(postings) > common:
+                        items = islice(reversed(items), common)
+                    for session_id, tf in items:
+                        weight = boost * tf / (tf + base + scale * lengths[session_id])
+                        scores[session_id] = scores.get(session_id, 0.0) + weight
+                else:
+                    for session_id in scores:
+                        tf = postings.get(session_id)
+                        if tf:
+                            scores[session_id] += boost * tf / (tf + base + scale * lengths[session_id])
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _apply_add(self, session_id: str, terms: Counter[str]) -> None:
+        # Re-insert instead of updating in place, so postings and documents
+        # stay ordered by when text was last added; compaction writes
+        # documents in that order and replay restores it.
+        doc = self._doc_terms.pop(session_id, None) or Counter()
+        self._doc_terms[session_id] = doc
+        doc.update(terms)
+        for term in terms:
+            postings = self._postings.setdefault(term, {})
+            postings.pop(session_id, None)
+            postings[session_id] = doc[term]
+        added = sum(terms.values())
+        self._doc_lengths[session_id] = self._doc_lengths.get(session_id, 0) + added
+        self._total_length += added
+
+    def _apply_remove(self, session_id: str) -> None:
+        for term in self._doc_terms.pop(session_id):
+            postings = self._postings[term]
+            del postings[session_id]
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._doc_lengths.pop(session_id)
+
+    def _append(self, record: dict) -> None:
+        if self.path is None:
+            return
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = self.path.open("ab")
+        self._file.write(_encode(record))
+        self._file.flush()
+        self._records += 1
+        if self._records > max(self.compact_min_records, 2 * len(self._doc_terms)):
+            self._compact()
+
+    def _compact(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        data = b"".join(
+            _encode({"op": "add", "id": session_id, "terms": terms})
+            for session_id, terms in self._doc_terms.items()
+        )
+        if self.backfilled:
+            data += _encode({"op": "backfilled"})
+        DurableWriter("none").write_atomic(self.path, data)
+        self._records = len(self._doc_terms) + int(self.backfilled)
+
+    def _load(self) -> None:
+        data = self.path.read_bytes()
+        if data and not data.endswith(b"\n"):
+            # Drop a record torn by a crash so later appends start on a new line.
+            data = data[: data.rfind(b"\n") + 1]
+            with self.path.open("r+b") as f:
+                f.truncate(len(data))
+        for line in data.splitlines():
+            try:
+                record = json.loads(line)
+                if record["op"] == "add":
+                    self._apply_add(record["id"], Counter(record["terms"]))
+                elif record["op"] == "del" and record["id"] in self._doc_terms:
+                    self._apply_remove(record["id"])
+                elif record["op"] == "backfilled":
+                    self.backfilled = True
+            except (ValueError, KeyError, TypeError):
+                logger.warning("Skipping unreadable search journal record in %s", self.path)
+                continue
+            self._records += 1
+
+
+def _encode(record: dict) -> bytes:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import gzip
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # only needed for the msgpack encoding
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # only needed for zstd cold storage
+    zstandard = None
+
+ENCODINGS = ("pretty", "compact", "msgpack")
+# File suffix of cold (compressed) session snapshots per compression method.
+COLD_SUFFIXES = {"gzip": ".json.gz", "zstd": ".json.zst"}
+
+
+def pack_message(message: Any) -> Any:
+    """Drop ``parts`` when it only repeats ``content``."""
+    if (
+        isinstance(message, dict)
+        and isinstance(message.get("content"), str)
+        and message.get("parts") == [message["content"]]
+    ):
+        return {k: v for k, v in message.items() if k != "parts"}
+    return message
+
+
+def unpack_message(message: Any) -> Any:
+    """Restore the ``parts`` field dropped by :func:`pack_message`."""
+    if isinstance(message, dict) and "parts" not in message and isinstance(message.get("content"), str):
+        return {**message, "parts": [message["content"]]}
+    return message
+
+
+def dumps_compact(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads_json(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class SessionCodec:
+    """Encode and decode session histories in one of three encodings.
+
+    * ``pretty``: indented JSON carrying both ``content`` and ``parts``; the
+      original format.
+    * ``compact``: minified JSON (via orjson when installed) with ``parts``
+      dropped when it only repeats ``content``.
+    * ``msgpack``: MessagePack with the same deduplication; needs the
+      ``msgpack`` package. JSONL logs stay line-delimited compact JSON.
+
+    Decoding accepts every encoding and restores ``parts``, so callers always
+    see the full message shape.
+    """
+
+    def __init__(self, encoding: str = "pretty") -> None:
+        if encoding not in ENCODINGS:
+            raise ValueError(f"encoding must be one of {', '.join(ENCODINGS)}")
+        if encoding == "msgpack" and msgpack is None:
+            raise ValueError("The msgpack encoding requires the msgpack package")
+        self.encoding = encoding
+
+    @property
+    def snapshot_suffix(self) -> str:
+        return ".msgpack" if self.encoding == "msgpack" else ".json"
+
+    def encode(self, history: list[dict[str, Any]]) -> bytes:
+        if self.encoding == "pretty":
+            return json.dumps(history, ensure_ascii=False, indent=2).encode("utf-8")
+        packed = [pack_message(message) for message in history]
+        if self.encoding == "msgpack":
+            return msgpack.packb(packed, use_bin_type=True)
+        return dumps_compact(packed)
+
+    def decode(self, data: bytes, suffix: str) -> list[dict[str, Any]]:
+        if suffix == ".msgpack":
+            if msgpack is None:
+                raise ValueError("Reading .msgpack sessions requires the msgpack package")
+            history = msgpack.unpackb(data, raw=False)
+        else:
+            history = loads_json(data)
+        if not isinstance(history, list):
+            raise ValueError("Stored session history must be a list")
+        return [unpack_message(message) for message in history]
+
+    def is_current(self, data: bytes, suffix: str) -> bool:
+        """Return True if ``data`` read from a ``suffix`` file needs no upgrade."""
+        if suffix != self.snapshot_suffix:
+            return False
+        if self.encoding == "compact":
+            # Minified JSON never contains a raw newline.
+            return b"\n" not in data
+        if self.encoding == "pretty":
+            # Indented JSON always does, unless the history is empty.
+            return b"\n" in data or data == b"[]"
+        return True
+
+    def encode_record(self, messages: list[dict[str, Any]]) -> bytes:
+        """Encode one JSONL log record, including its trailing newline."""
+        if self.encoding == "pretty":
+            line = json.dumps({"messages": messages}, ensure_ascii=False).encode("utf-8")
+        else:
+            line = dumps_compact({"messages": [pack_message(message) for message in messages]})
+        return line + b"\n"
+
+    def decode_log(self, data: bytes) -> list[dict[str, Any]]:
+        """Replay a JSONL log, skipping a torn record left by an interrupted append."""
+        history: list[dict[str, Any]] = []
+        for line in data.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = loads_json(line)
+            except ValueError:
+                continue
+            messages = record.get("messages") if isinstance(record, dict) else None
+            if not isinstance(messages, list):
+                raise ValueError("Stored session log records must contain a message list")
+            history.extend(unpack_message(message) for message in messages)
+        return history
+
+
+def compress_history(history: list[dict[str, Any]], compression: str) -> bytes:
+    """Encode a history as compact JSON compressed for cold storage."""
+    data = dumps_compact([pack_message(message) for message in history])
+    if compression == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package")
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=6)
+    raise ValueError(f"compression must be one of {', '.join(COLD_SUFFIXES)}")
+
+
+def decompress_history(data: bytes, name: str) -> tuple[list[dict[str, Any]], int]:
+    """Decode a cold snapshot; returns the history and its uncompressed size."""
+    if name.endswith(COLD_SUFFIXES["zstd"]):
+        if zstandard is None:
+            raise ValueError("Reading .zst sessions requires the zstandard package")
+        raw = zstandard.ZstdDecompressor().decompress(data)
+    else:
+        raw = gzip.decompress(data)
+    history = loads_json(raw)
+    if not isinstance(history, list):
+        raise ValueError("Stored session history must be a list")
+    return [unpack_message(message) for message in history], len(raw)
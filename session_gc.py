@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import threading
+from collections.abc import Callable
+from contextlib import ExitStack
+from datetime import datetime, timedelta, timezone
+
+from session_locks import SessionLockManager
+from session_store import SessionStore
+
+
+class SessionSweeper:
+    """Delete sessions past their retention, least recently updated first.
+
+    A session expires once its ``updated_at`` is older than ``max_age``
+    seconds. While the histories of all sessions take more than ``max_bytes``,
+    the oldest ones are deleted too. Either limit is off when 0.
+
+    Sessions are deleted in batches of ``batch_size``: the batch's session
+    locks are held while its histories are deleted and its metadata entries
+    are dropped in one write, and the sweeper pauses ``batch_pause`` seconds
+    between batches so request handling is not starved. A session updated
+    since the sweep started is skipped. ``on_delete`` is called with the id of
+    every deleted session.
+    """
+
+    def __init__(
+        self,
+        store: SessionStore,
+        locks: SessionLockManager,
+        max_age: float = 0.0,
+        max_bytes: int = 0,
+        batch_size: int = 100,
+        batch_pause: float = 0.05,
+        on_delete: Callable[[str], None] | None = None,
+    ) -> None:
+        self.store = store
+        self.locks = locks
+        self.max_age = max(0.0, max_age)
+        self.max_bytes = max(0, max_bytes)
+        self.batch_size = max(1, batch_size)
+        self.batch_pause = max(0.0, batch_pause)
+        self.on_delete = on_delete
+        self._stopped = threading.Event()
+
+    def sweep(self) -> dict[str, int]:
+        """Run one pass; returns the sessions and bytes reclaimed."""
+        report = {"sessions": 0, "bytes": 0}
+        candidates = self._candidates()
+        for start in range(0, len(candidates), self.batch_size):
+            if start and self._stopped.wait(self.batch_pause):
+                break
+            sessions, reclaimed = self._delete_batch(candidates[start : start + self.batch_size])
+            report["sessions"] += sessions
+            report["bytes"] += reclaimed
+        return report
+
+    def stop(self) -> None:
+        """Make a running sweep stop after its current batch."""
+        self._stopped.set()
+
+    def _candidates(self) -> list[dict[str, str]]:
+        # Oldest first, so both limits are met by deleting a prefix.
+        entries = list(reversed(self.store.list_recent_metadata()))
+        cutoff = ""
+        if self.max_age:
+            cutoff = (datetime.now(timezone.utc) - timedelta(seconds=self.max_age)).isoformat()
+
+        sizes: dict[str, int] = {}
+        excess = 0
+        if self.max_bytes:
+            sizes = {entry["id"]: self.store.history_size(entry["id"]) for entry in entries}
+            excess = sum(sizes.values()) - self.max_bytes
+
+        candidates: list[dict[str, str]] = []
+        for entry in entries:
+            # Entries without a timestamp predate updated_at and never expire by age.
+            expired = bool(cutoff) and "" < entry["updated_at"] < cutoff
+            if not expired and excess <= 0:
+                if entry["updated_at"]:
+                    break
+                continue
+            excess -= sizes.get(entry["id"], 0)
+            candidates.append(entry)
+        return candidates
+
+    def _delete_batch(self, batch: list[dict[str, str]]) -> tuple[int, int]:
+        expected = {entry["id"]: entry["updated_at"] for entry in batch}
+
+        def unchanged(session_id: str) -> bool:
+            current = self.store.get_metadata(session_id)
+            return current is not None and current["updated_at"] == expected[session_id]
+
+        deleted, reclaimed = delete_sessions(
+            self.store, self.locks, list(expected), should_delete=unchanged
+        )
+        if self.on_delete is not None:
+            for session_id in deleted:
+                self.on_delete(session_id)
+        return len(deleted), reclaimed
+
+
+def delete_sessions(
+    store: SessionStore,
+    locks: SessionLockManager,
+    session_ids: list[str],
+    should_delete: Callable[[str], bool] | None = None,
+) -> tuple[list[str], int]:
+    """Delete sessions and their metadata entries as one batch.
+
+    The session locks of the whole batch are held throughout, taken in id
+    order so two batch deleters cannot deadlock. Histories and metadata
+    entries are each removed with one batch call on the store. Sessions for
+    which ``should_delete`` returns False (checked under the lock) are left
+    alone. Returns the deleted ids and the bytes reclaimed.
+    """
+    session_ids = sorted(set(session_ids))
+    with ExitStack() as stack:
+        for session_id in session_ids:
+            stack.enter_context(locks.lock(session_id))
+        targets = [sid for sid in session_ids if should_delete is None or should_delete(sid)]
+        reclaimed = sum(store.history_size(session_id) for session_id in targets)
+        store.delete_history_many(targets)
+        store.delete_metadata_many(targets)
+    return targets, reclaimed
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections.abc import AsyncIterator, Iterator
+from contextlib import asynccontextmanager, contextmanager
+
+
+class SessionLockManager:
+    """Hand out one lock per session id.
+
+    Locks are created on first use and dropped once no thread holds or waits
+    for them, so memory stays proportional to the number of sessions that are
+    busy right now. Different session ids never block each other.
+    """
+
+    def __init__(self) -> None:
+        self._guard = threading.Lock()
+        # session_id -> (lock, number of threads holding or waiting for it)
+        self._locks: dict[str, tuple[threading.Lock, int]] = {}
+        # Same for async_lock(); only touched from the event loop.
+        self._async_locks: dict[str, tuple[asyncio.Lock, int]] = {}
+
+    @contextmanager
+    def lock(self, session_id: str) -> Iterator[None]:
+        with self._guard:
+            lock, users = self._locks.get(session_id, (None, 0))
+            if lock is None:
+                lock = threading.Lock()
+            self._locks[session_id] = (lock, users + 1)
+
+        lock.acquire()
+        try:
+            yield
+        finally:
+            lock.release()
+            with self._guard:
+                _, users = self._locks[session_id]
+                if users == 1:
+                    del self._locks[session_id]
+                else:
+                    self._locks[session_id] = (lock, users - 1)
+
+    @asynccontextmanager
+    async def async_lock(self, session_id: str) -> AsyncIterator[None]:
+        """Serialize coroutines on ``session_id`` without holding a thread.
+
+        These locks are separate from :meth:`lock`: they order async work on
+        a session (such as a chat turn waiting for the model), while the
+        writes it makes still take :meth:`lock`.
+        """
+        lock, users = self._async_locks.get(session_id, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._async_locks[session_id] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            _, users = self._async_locks[session_id]
+            if users == 1:
+                del self._async_locks[session_id]
+            else:
+                self._async_locks[session_id] = (lock, users - 1)
+
+    def __len__(self) -> int:
+        with self._guard:
+            return len(self._locks)
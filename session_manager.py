@@ -1,43 +1,346 @@
 from __future__ import annotations
 
-import json
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any
 
+from durable_io import DurableWriter
+from metadata_store import MetadataStore
+from session_codec import (
+    COLD_SUFFIXES,
+    SessionCodec,
+    compress_history,
+    decompress_history,
+    dumps_compact,
+    loads_json,
+)
+from session_locks import SessionLockManager
+from session_store import SessionStore, VersionConflictError
+from session_summary import message_text
 
-class SessionManager:
-    """Persist chat history per session_id under ./sessions as JSON files."""
+STORAGE_MODES = ("json", "jsonl")
+LAYOUTS = ("flat", "sharded")
+SESSION_SUFFIXES = (".json", ".msgpack", ".jsonl", *COLD_SUFFIXES.values())
+# Files in the sessions directory that are not session histories.
+RESERVED_FILES = {"metadata.json"}
+# Summaries are kept next to the history, in <id>.summary.
+SUMMARY_SUFFIX = ".summary"
+# Generated titles are cached in titles/<key>, outside any session's files.
+TITLE_CACHE_DIR = "titles"
+# Threads for batch writes (imports, bulk deletes); concurrent writers share fsyncs.
+BATCH_WORKERS = 16
 
-    def __init__(self, sessions_dir: str | Path = "sessions") -> None:
+
+def session_id_of(path: Path) -> str | None:
+    """Return the sanitized session id of a session file, or None for other files."""
+    if path.name in RESERVED_FILES or not path.name.endswith(SESSION_SUFFIXES):
+        return None
+    return path.name.split(".", 1)[0]
+
+
+def iter_session_files(sessions_dir: Path) -> Iterator[Path]:
+    """Yield the session history files of both the flat and the sharded layout."""
+    for pattern in ("*", "*/*/*"):
+        for path in sessions_dir.glob(pattern):
+            if session_id_of(path) is not None and path.is_file():
+                yield path
+
+
+def detect_layout(sessions_dir: Path) -> str:
+    """Return ``sharded`` if any session file sits in a shard directory, else ``flat``."""
+    for path in Path(sessions_dir).glob("*/*/*"):
+        if session_id_of(path) is not None and path.is_file():
+            return "sharded"
+    return "flat"
+
+
+def scan_session(paths: list[str]) -> dict[str, Any]:
+    """Derive a metadata entry from the files of one session.
+
+    The most recently modified file holds the current history. Runs in worker
+    processes during :meth:`SessionManager.rebuild_metadata`; unreadable
+    sessions come back with an ``error`` instead of raising. ``updated_at``
+    falls back to the file's mtime; ``last_message_at`` is the newest
+    message's own timestamp, or empty when it has none.
+    """
+    path = Path(max(paths, key=lambda p: os.stat(p).st_mtime))
+    session_id = session_id_of(path)
+    try:
+        data = path.read_bytes()
+        if path.name.endswith(tuple(COLD_SUFFIXES.values())):
+            history, _ = decompress_history(data, path.name)
+        elif path.suffix == ".jsonl":
+            history = SessionCodec().decode_log(data)
+        else:
+            history = SessionCodec().decode(data, path.suffix)
+    except (OSError, ValueError) as exc:
+        return {"id": session_id, "error": str(exc)}
+
+    messages = [m for m in history if isinstance(m, dict)]
+    first_user = next((m for m in messages if m.get("role") == "user"), None)
+    last_reply = next((m for m in reversed(messages) if m.get("role") != "user"), None)
+    created_at = messages[-1].get("created_at") if messages else None
+    if not isinstance(created_at, str):
+        created_at = ""
+    return {
+        "id": session_id,
+        "title": _title_from_text(message_text(first_user) if first_user else ""),
+        "updated_at": created_at
+        or datetime.fromtimestamp(path.stat().st_mtime, timezone.utc).isoformat(),
+        "last_message_at": created_at,
+        "preview": message_text(last_reply)[:140] if last_reply else "",
+    }
+
+
+def _title_from_text(text: str) -> str:
+    """Stand-in title of at most four words, shaped like generated titles."""
+    words = [re.sub(r"[^A-Za-z0-9]+", "", w) for w in text.split()]
+    words = [w for w in words if w][:4]
+    return " ".join(words) or "New Session"
+
+
+class HistoryCache:
+    """Thread-safe LRU cache of session histories, bounded by total bytes.
+
+    Sizes are the encoded on-disk size of each history, which tracks memory use
+    closely enough for budgeting. A ``max_bytes`` of 0 disables caching.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max(0, max_bytes)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, tuple[list[dict[str, Any]], int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def get(
+        self, key: str, start: int = 0, stop: int | None = None
+    ) -> list[dict[str, Any]] | None:
+        """Return a copy of the cached history (or of a slice), or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0][start:stop]
+
+    def put(self, key: str, history: list[dict[str, Any]], size: int) -> None:
+        with self._lock:
+            self._remove(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (list(history), size)
+            self.total_bytes += size
+            self._evict()
+
+    def extend(self, key: str, messages: list[dict[str, Any]], size: int) -> None:
+        """Append messages to a cached history; no-op when the key is not cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            history, old_size = entry
+            if old_size + size > self.max_bytes:
+                self._remove(key)
+                return
+            history.extend(messages)
+            self._entries[key] = (history, old_size + size)
+            self._entries.move_to_end(key)
+            self.total_bytes += size
+            self._evict()
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[1]
+
+    def _evict(self) -> None:
+        while self.total_bytes > self.max_bytes and self._entries:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+
+
+class SessionManager(SessionStore):
+    """Persist chat history per session_id under ./sessions.
+
+    Metadata is kept in a :class:`MetadataStore` journal. Histories are cached
+    in a write-through :class:`HistoryCache`, which assumes this process is
+    the only writer of ``sessions_dir``.
+    """
+
+    def __init__(
+        self,
+        sessions_dir: str | Path = "sessions",
+        storage_mode: str = "json",
+        compact_every: int = 64,
+        cache_max_bytes: int = 32 * 1024 * 1024,
+        writer: DurableWriter | None = None,
+        encoding: str = "pretty",
+        metadata_flush_interval: float = 0.0,
+        layout: str = "flat",
+        compression: str = "gzip",
+        title_cache_max_entries: int = 10_000,
+    ) -> None:
+        if storage_mode not in STORAGE_MODES:
+            raise ValueError(f"storage_mode must be one of {', '.join(STORAGE_MODES)}")
+        if layout not in LAYOUTS:
+            raise ValueError(f"layout must be one of {', '.join(LAYOUTS)}")
         self.sessions_dir = Path(sessions_dir)
         self.sessions_dir.mkdir(parents=True, exist_ok=True)
+        self.storage_mode = storage_mode
+        self.layout = layout
+        if compression not in COLD_SUFFIXES:
+            raise ValueError(f"compression must be one of {', '.join(COLD_SUFFIXES)}")
+        self.compression = compression
+        self.compact_every = max(1, compact_every)
+        self.codec = SessionCodec(encoding)
+        self.title_cache_max_entries = max(0, title_cache_max_entries)
+        self._title_saves = 0
+        self._title_lock = threading.Lock()
+        # Records appended to each log since it was last compacted by this process.
+        self._appends_since_compaction: dict[str, int] = {}
+        self._cache = HistoryCache(cache_max_bytes)
+        self._locks = SessionLockManager()
+        self._writer = writer or DurableWriter("none")
+        self._closing = threading.Event()
+        self._metadata = MetadataStore(
+            self.sessions_dir / "metadata.journal",
+            legacy_path=self.sessions_dir / "metadata.json",
+            writer=self._writer,
+            flush_interval=metadata_flush_interval,
+        )
 
-    def _session_file(self, session_id: str) -> Path:
+    def _safe_session_id(self, session_id: str) -> str:
         safe_session_id = "".join(c for c in session_id if c.isalnum() or c in ("-", "_"))
         if not safe_session_id:
             raise ValueError("session_id must contain at least one valid character")
-        return self.sessions_dir / f"{safe_session_id}.json"
+        return safe_session_id
+
+    def _session_dir(self, session_id: str) -> Path:
+        """Return where a session's files live: ``ab/cd/`` of its id's SHA-1 when sharded."""
+        if self.layout == "flat":
+            return self.sessions_dir
+        digest = hashlib.sha1(self._safe_session_id(session_id).encode("utf-8")).hexdigest()
+        return self.sessions_dir / digest[:2] / digest[2:4]
+
+    def _session_file(self, session_id: str) -> Path:
+        """Return the snapshot path for the configured encoding and layout."""
+        safe_session_id = self._safe_session_id(session_id)
+        return self._session_dir(session_id) / f"{safe_session_id}{self.codec.snapshot_suffix}"
+
+    def _log_file(self, session_id: str) -> Path:
+        return self._session_dir(session_id) / f"{self._safe_session_id(session_id)}.jsonl"
+
+    def _snapshot_files(self, session_id: str) -> list[Path]:
+        """Return the possible snapshot files in lookup order.
+
+        The configured encoding comes first, and the current layout before
+        the flat one.
+        """
+        session_file = self._session_file(session_id)
+        other_suffix = ".json" if session_file.suffix == ".msgpack" else ".msgpack"
+        files = [session_file, session_file.with_suffix(other_suffix)]
+        if self.layout == "sharded":
+            files += [self.sessions_dir / path.name for path in files]
+        return files
+
+    def _log_files(self, session_id: str) -> list[Path]:
+        log_file = self._log_file(session_id)
+        if self.layout == "sharded":
+            return [log_file, self.sessions_dir / log_file.name]
+        return [log_file]
+
+    def _cold_files(self, session_id: str) -> list[Path]:
+        """Return the possible cold files, the configured compression's first."""
+        safe_session_id = self._safe_session_id(session_id)
+        suffixes = sorted(COLD_SUFFIXES.values(), key=lambda s: s != COLD_SUFFIXES[self.compression])
+        directories = [self._session_dir(session_id)]
+        if self.layout == "sharded":
+            directories.append(self.sessions_dir)
+        return [d / f"{safe_session_id}{suffix}" for d in directories for suffix in suffixes]
+
+    def _summary_files(self, session_id: str) -> list[Path]:
+        name = f"{self._safe_session_id(session_id)}{SUMMARY_SUFFIX}"
+        files = [self._session_dir(session_id) / name]
+        if self.layout == "sharded":
+            files.append(self.sessions_dir / name)
+        return files
+
+    def _hot_files(self, session_id: str) -> list[Path]:
+        return [*self._snapshot_files(session_id), *self._log_files(session_id)]
+
+    def _existing_cold(self, session_id: str) -> Path | None:
+        return next((path for path in self._cold_files(session_id) if path.exists()), None)
+
+    def _existing_snapshot(self, session_id: str) -> Path | None:
+        return next((path for path in self._snapshot_files(session_id) if path.exists()), None)
+
+    def _existing_log(self, session_id: str) -> Path | None:
+        return next((path for path in self._log_files(session_id) if path.exists()), None)
 
     def session_exists(self, session_id: str) -> bool:
-        """Return True when the session JSON file exists."""
+        """Return True when the session has a snapshot, a JSONL log or a cold file."""
+        if self._safe_session_id(session_id) in self._cache:
+            return True
         self.sessions_dir.mkdir(parents=True, exist_ok=True)
-        return self._session_file(session_id).exists()
+        return (
+            self._existing_snapshot(session_id) is not None
+            or self._existing_log(session_id) is not None
+            or self._existing_cold(session_id) is not None
+        )
 
     def get_history(self, session_id: str) -> list[dict[str, Any]]:
-        """Return session history; [] if the session file does not exist."""
-        session_file = self._session_file(session_id)
-        if not session_file.exists():
-            return []
+        """Return session history; [] if the session does not exist."""
+        # Load under the session lock so a concurrent write cannot be cached
+        # and then overwritten by an older copy read here.
+        with self._locks.lock(self._safe_session_id(session_id)):
+            return self._load_history(session_id)
 
-        with session_file.open("r", encoding="utf-8") as f:
-            data = json.load(f)
+    def get_history_range(
+        self, session_id: str, offset: int = 0, limit: int | None = None
+    ) -> list[dict[str, Any]]:
+        """Return ``limit`` messages starting at ``offset``.
 
-        if not isinstance(data, list):
-            raise ValueError("Stored session history must be a list")
-        return data
+        Cached histories are sliced without copying the whole conversation.
+        """
+        stop = None if limit is None else offset + limit
+        with self._locks.lock(self._safe_session_id(session_id)):
+            return self._load_history(session_id, offset, stop)
 
     def save_history(self, session_id: str, history: list[dict[str, Any]]) -> None:
-        """Write updated session history to disk.
+        """Replace the stored session history.
 
         Expected format:
         [
@@ -45,15 +348,474 @@ class SessionManager:
             ...
         ]
         """
-        session_file = self._session_file(session_id)
+        with self._locks.lock(self._safe_session_id(session_id)):
+            self._save_history(session_id, history)
+            self._discard_summary(session_id)
 
-        with session_file.open("w", encoding="utf-8") as f:
-            json.dump(history, f, ensure_ascii=False, indent=2)
+    def append_history(
+        self,
+        session_id: str,
+        messages: list[dict[str, Any]],
+        expected_version: int | None = None,
+    ) -> None:
+        """Append one turn (a list of messages) to the stored history.
 
-    def delete_history(self, session_id: str) -> bool:
-        """Delete a session history file. Returns True if deleted, False if absent."""
-        session_file = self._session_file(session_id)
-        if not session_file.exists():
+        In ``jsonl`` mode this writes a single record at the end of the log, so
+        the cost does not depend on the length of the conversation.
+        """
+        with self._locks.lock(self._safe_session_id(session_id)):
+            if expected_version is not None:
+                version = len(self._load_history(session_id))
+                if version != expected_version:
+                    raise VersionConflictError(
+                        f"Session {session_id} is at version {version}, expected {expected_version}"
+                    )
+            self._append_history(session_id, messages)
+            self._discard_summary(session_id)
+
+    def _append_history(self, session_id: str, messages: list[dict[str, Any]]) -> None:
+        if (
+            self.storage_mode != "jsonl"
+            or self._existing_snapshot(session_id) is not None
+            or self._existing_cold(session_id) is not None
+        ):
+            # Snapshot storage, or a snapshot or cold session that is turned
+            # into a hot log by rewriting it once.
+            self._save_history(session_id, [*self._load_history(session_id), *messages])
+            return
+
+        log_file = self._log_file(session_id)
+        existing_log = self._existing_log(session_id)
+        log_file.parent.mkdir(parents=True, exist_ok=True)
+        if existing_log is not None and existing_log != log_file:
+            os.replace(existing_log, log_file)
+        record = self.codec.encode_record(messages)
+        with log_file.open("ab+") as f:
+            is_new_log = f.tell() == 0
+            if not is_new_log:
+                # A crash can leave a torn record without its newline; start on
+                # a fresh line so the new record stays readable.
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    record = b"\n" + record
+            f.write(record)
+            self._writer.sync(f)
+        if is_new_log:
+            self._writer.sync_dir(log_file.parent)
+        key = self._safe_session_id(session_id)
+        if is_new_log:
+            self._cache.put(key, messages, len(record))
+        else:
+            self._cache.extend(key, messages, len(record))
+
+        appends = self._appends_since_compaction.get(session_id, 0) + 1
+        self._appends_since_compaction[session_id] = appends
+        if appends >= self.compact_every:
+            self._compact(session_id)
+
+    def compact(self, session_id: str) -> bool:
+        """Collapse a session log into one record. Returns False if there is no log.
+
+        ``jsonl`` mode does this by itself every ``compact_every`` appends.
+        """
+        with self._locks.lock(self._safe_session_id(session_id)):
+            return self._compact(session_id)
+
+    def _compact(self, session_id: str) -> bool:
+        log_file = self._existing_log(session_id)
+        if log_file is None:
             return False
-        session_file.unlink()
+        history, _ = self._replay_log(log_file)
+        self._write_log_snapshot(session_id, history)
+        if log_file != self._log_file(session_id):
+            log_file.unlink()
         return True
+
+    def delete_history(self, session_id: str) -> bool:
+        """Delete a session history. Returns True if deleted, False if absent."""
+        with self._locks.lock(self._safe_session_id(session_id)):
+            self._appends_since_compaction.pop(session_id, None)
+            self._cache.discard(self._safe_session_id(session_id))
+            deleted = False
+            for path in [*self._hot_files(session_id), *self._cold_files(session_id)]:
+                if path.exists():
+                    path.unlink()
+                    deleted = True
+            self._discard_summary(session_id)
+            return deleted
+
+    def import_sessions(self, sessions: list[dict[str, Any]]) -> None:
+        """Replace a batch of sessions.
+
+        Histories are written by a thread pool so their fsyncs share group
+        commits, and the metadata of the whole batch is one journal write.
+        """
+        with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as pool:
+            # list() re-raises the first failed write.
+            list(
+                pool.map(
+                    lambda session: self.save_history(session["id"], session["history"]),
+                    sessions,
+                )
+            )
+        self._metadata.upsert_many(
+            [
+                {
+                    "id": session["id"],
+                    "title": str(session["metadata"].get("title") or "New Session"),
+                    "updated_at": str(session["metadata"].get("updated_at", "")),
+                    "preview": str(session["metadata"].get("preview", "")),
+                }
+                for session in sessions
+                if session["metadata"] is not None
+            ]
+        )
+
+    def history_size(self, session_id: str) -> int:
+        """Return the bytes of all files stored for a session."""
+        size = 0
+        for path in [
+            *self._hot_files(session_id),
+            *self._cold_files(session_id),
+            *self._summary_files(session_id),
+        ]:
+            try:
+                size += path.stat().st_size
+            except FileNotFoundError:
+                continue
+        return size
+
+    def get_summary(self, session_id: str) -> dict[str, Any] | None:
+        """Return the stored summary of a session, or None if there is none."""
+        with self._locks.lock(self._safe_session_id(session_id)):
+            for path in self._summary_files(session_id):
+                try:
+                    return loads_json(path.read_bytes())
+                except FileNotFoundError:
+                    continue
+            return None
+
+    def save_summary(self, session_id: str, summary: dict[str, Any]) -> None:
+        """Store the summary of a session's current history."""
+        with self._locks.lock(self._safe_session_id(session_id)):
+            path, *stale = self._summary_files(session_id)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._writer.write_atomic(path, dumps_compact(summary))
+            for stale_path in stale:
+                stale_path.unlink(missing_ok=True)
+
+    def _discard_summary(self, session_id: str) -> None:
+        for path in self._summary_files(session_id):
+            path.unlink(missing_ok=True)
+
+    def delete_history_many(self, session_ids: list[str]) -> int:
+        """Delete several session histories from a thread pool."""
+        with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as pool:
+            return sum(pool.map(self.delete_history, session_ids))
+
+    def list_metadata(self) -> list[dict[str, str]]:
+        """Return the metadata entries of all sessions, in no particular order."""
+        return self._metadata.items()
+
+    def list_recent_metadata(
+        self, limit: int | None = None, after: tuple[str, str] | None = None
+    ) -> list[dict[str, str]]:
+        """Return metadata entries ordered by ``(updated_at, id)``, newest first."""
+        return self._metadata.page(limit=limit, after=after)
+
+    def list_metadata_by_id(
+        self, limit: int | None = None, after: str | None = None
+    ) -> list[dict[str, str]]:
+        """Return metadata entries ordered by id, only ids greater than ``after``."""
+        return self._metadata.page_by_id(limit=limit, after=after)
+
+    def iter_history_ids(self) -> Iterator[str]:
+        """Yield the sanitized id of every session file; an id repeats per file."""
+        for path in iter_session_files(self.sessions_dir):
+            yield session_id_of(path)
+
+    def history_id(self, session_id: str) -> str:
+        return self._safe_session_id(session_id)
+
+    def get_metadata(self, session_id: str) -> dict[str, str] | None:
+        """Return the metadata entry of one session, or None if there is none."""
+        return self._metadata.get(session_id)
+
+    def update_metadata(
+        self,
+        session_id: str,
+        title: str,
+        updated_at: str | None = None,
+        preview: str | None = None,
+    ) -> None:
+        """Create or update a metadata entry; None leaves a field unchanged."""
+        self._metadata.upsert(session_id, title, updated_at=updated_at, preview=preview)
+
+    def delete_metadata(self, session_id: str) -> bool:
+        """Delete a metadata entry. Returns True if deleted, False if absent."""
+        return self._metadata.delete(session_id)
+
+    def delete_metadata_many(self, session_ids: list[str]) -> int:
+        """Delete several metadata entries with one journal write."""
+        return self._metadata.delete_many(session_ids)
+
+    def cache_stats(self) -> dict[str, int]:
+        """Return hit/miss/eviction counters and usage of the history cache."""
+        return self._cache.stats()
+
+    def get_cached_title(self, key: str) -> str | None:
+        """Return a cached generated title; a hit bumps its file's mtime."""
+        if not self.title_cache_max_entries:
+            return None
+        path = self._title_path(key)
+        try:
+            title = path.read_text(encoding="utf-8")
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return title or None
+
+    def save_cached_title(self, key: str, title: str) -> None:
+        """Cache a generated title as a file in ``sessions/titles``.
+
+        Every process sharing the directory sees it. Every
+        ``title_cache_max_entries // 10`` saves, the least recently used
+        files beyond that bound are deleted.
+        """
+        if not self.title_cache_max_entries:
+            return
+        path = self._title_path(key)
+        path.parent.mkdir(exist_ok=True)
+        # A cache entry is cheap to regenerate, so it is not fsynced.
+        DurableWriter("none").write_atomic(path, title.encode("utf-8"))
+        with self._title_lock:
+            self._title_saves += 1
+            prune = self._title_saves >= max(1, self.title_cache_max_entries // 10)
+            if prune:
+                self._title_saves = 0
+        if prune:
+            self._prune_title_cache()
+
+    def _title_path(self, key: str) -> Path:
+        if not key.isalnum():
+            raise ValueError("Title cache keys must be alphanumeric")
+        return self.sessions_dir / TITLE_CACHE_DIR / key
+
+    def _prune_title_cache(self) -> None:
+        entries = []
+        for path in (self.sessions_dir / TITLE_CACHE_DIR).iterdir():
+            if path.name.endswith(".tmp"):  # another writer's pending entry
+                continue
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except FileNotFoundError:
+                continue
+        excess = len(entries) - self.title_cache_max_entries
+        if excess <= 0:
+            return
+        entries.sort()
+        for _, path in entries[:excess]:
+            path.unlink(missing_ok=True)
+
+    def rebuild_metadata(self, workers: int | None = None) -> dict[str, float]:
+        """Rebuild metadata from the session files and drop orphaned entries.
+
+        Files are parsed in parallel by a pool of ``workers`` processes.
+        Sessions without an entry get one with a title made from their first
+        message. Existing entries keep their title, take ``preview`` from the
+        history, and keep ``updated_at`` unless it is missing or older than
+        the newest message (the stored value is taken after the turn's
+        messages, so it is normally a little later). Entries without a
+        history are removed.
+        Meant to run before the API serves requests. Returns counts and
+        throughput.
+        """
+        started = time.perf_counter()
+        files: dict[str, list[str]] = {}
+        for path in iter_session_files(self.sessions_dir):
+            files.setdefault(session_id_of(path), []).append(str(path))
+
+        existing: dict[str, dict[str, str]] = {}
+        # Ids that cannot name a file never have a history.
+        orphans: list[str] = []
+        for entry in self._metadata.items():
+            try:
+                existing[self._safe_session_id(entry["id"])] = entry
+            except ValueError:
+                orphans.append(entry["id"])
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            scanned = list(pool.map(scan_session, files.values(), chunksize=64))
+
+        upserts: list[dict[str, str]] = []
+        created = unreadable = 0
+        for result in scanned:
+            if "error" in result:
+                unreadable += 1
+                continue
+            last_message_at = result.pop("last_message_at")
+            entry = existing.get(result["id"])
+            if entry is None:
+                created += 1
+                upserts.append(result)
+                continue
+            updated_at = entry["updated_at"]
+            if not updated_at or updated_at < last_message_at:
+                updated_at = result["updated_at"]
+            if (updated_at, result["preview"]) != (entry["updated_at"], entry["preview"]):
+                upserts.append(
+                    {**result, "id": entry["id"], "title": entry["title"], "updated_at": updated_at}
+                )
+        orphans.extend(entry["id"] for safe_id, entry in existing.items() if safe_id not in files)
+
+        self._metadata.upsert_many(upserts)
+        removed = self._metadata.delete_many(orphans)
+        seconds = time.perf_counter() - started
+        return {
+            "sessions": len(files),
+            "created": created,
+            "updated": len(upserts) - created,
+            "removed": removed,
+            "unreadable": unreadable,
+            "seconds": round(seconds, 3),
+            "sessions_per_second": round(len(files) / seconds, 1) if seconds else 0.0,
+        }
+
+    def migrate_flat_layout(self) -> int:
+        """Move session files left in the flat layout into their shard directories.
+
+        Until then such files are read in place and moved on their next
+        write. Each file is moved under its session's lock, and the pass
+        ends at :meth:`close`. Returns the number of files handled.
+        """
+        if self.layout != "sharded":
+            return 0
+        moved = 0
+        for path in list(self.sessions_dir.iterdir()):
+            if self._closing.is_set():
+                break
+            session_id = session_id_of(path)
+            if session_id is None:
+                continue
+            with self._locks.lock(session_id):
+                if not path.is_file():
+                    continue
+                session_dir = self._session_dir(session_id)
+                sharded_files = [
+                    p for p in [*self._hot_files(session_id), *self._cold_files(session_id)]
+                    if p.parent == session_dir
+                ]
+                if any(p.exists() for p in sharded_files):
+                    # The session was written since; the flat copy is stale.
+                    path.unlink()
+                else:
+                    target = self._session_dir(session_id) / path.name
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    os.replace(path, target)
+            moved += 1
+        return moved
+
+    def compress_idle_sessions(self, idle_seconds: float) -> dict[str, int]:
+        """Move sessions not written for ``idle_seconds`` to compressed cold storage.
+
+        A cold session is one compact JSON snapshot compressed with
+        ``compression`` (``<id>.json.gz`` or ``<id>.json.zst``); it is
+        decompressed on read and becomes a hot file again on its next write.
+        Returns how many sessions were compressed and their total size
+        before and after.
+        """
+        cutoff = time.time() - idle_seconds
+        report = {"sessions": 0, "bytes_before": 0, "bytes_after": 0}
+        for path in list(iter_session_files(self.sessions_dir)):
+            if self._closing.is_set():
+                break
+            session_id = session_id_of(path)
+            if session_id is None or path.name.endswith(tuple(COLD_SUFFIXES.values())):
+                continue
+            with self._locks.lock(session_id):
+                hot_files = [p for p in self._hot_files(session_id) if p.exists()]
+                if not hot_files or max(p.stat().st_mtime for p in hot_files) > cutoff:
+                    continue
+                bytes_before = sum(p.stat().st_size for p in hot_files)
+                history = self._load_history(session_id)
+                data = compress_history(history, self.compression)
+                cold_file = self._cold_files(session_id)[0]
+                cold_file.parent.mkdir(parents=True, exist_ok=True)
+                self._writer.write_atomic(cold_file, data)
+                for p in [*self._hot_files(session_id), *self._cold_files(session_id)[1:]]:
+                    p.unlink(missing_ok=True)
+                self._cache.discard(session_id)
+                report["bytes_before"] += bytes_before
+                report["bytes_after"] += len(data)
+                self._appends_since_compaction.pop(session_id, None)
+                report["sessions"] += 1
+        return report
+
+    def close(self) -> None:
+        """Close the metadata journal and finish pending group commits."""
+        self._closing.set()
+        self._metadata.close()
+        self._writer.close()
+
+    def _load_history(
+        self, session_id: str, start: int = 0, stop: int | None = None
+    ) -> list[dict[str, Any]]:
+        """Return ``history[start:stop]`` from its snapshot, JSONL log or cold file.
+
+        Either storage mode reads files written by the other.
+        """
+        key = self._safe_session_id(session_id)
+        cached = self._cache.get(key, start, stop)
+        if cached is not None:
+            return cached
+
+        snapshot = self._existing_snapshot(session_id)
+        log_file = self._existing_log(session_id)
+        if snapshot is not None and not (self.storage_mode == "jsonl" and log_file is not None):
+            data = snapshot.read_bytes()
+            history = self.codec.decode(data, snapshot.suffix)
+            if self.storage_mode == "json" and not self.codec.is_current(data, snapshot.suffix):
+                # Lazily upgrade snapshots written in another encoding.
+                self._save_history(session_id, history)
+                return history[start:stop]
+            size = len(data)
+        elif log_file is not None:
+            history, size = self._replay_log(log_file)
+        else:
+            cold_file = self._existing_cold(session_id)
+            if cold_file is None:
+                return []
+            history, size = decompress_history(cold_file.read_bytes(), cold_file.name)
+        self._cache.put(key, history, size)
+        return history[start:stop]
+
+    def _save_history(self, session_id: str, history: list[dict[str, Any]]) -> None:
+        """Write the history atomically through ``writer`` and drop the files it replaces."""
+        snapshot_files = self._snapshot_files(session_id)
+        log_files = self._log_files(session_id)
+        cold_files = self._cold_files(session_id)
+
+        if self.storage_mode == "jsonl":
+            self._write_log_snapshot(session_id, history)
+            for path in [*snapshot_files, *log_files[1:], *cold_files]:
+                path.unlink(missing_ok=True)
+            return
+
+        data = self.codec.encode(history)
+        snapshot_files[0].parent.mkdir(parents=True, exist_ok=True)
+        self._writer.write_atomic(snapshot_files[0], data)
+        for path in [*snapshot_files[1:], *log_files, *cold_files]:
+            path.unlink(missing_ok=True)
+        self._cache.put(self._safe_session_id(session_id), history, len(data))
+
+    def _replay_log(self, log_file: Path) -> tuple[list[dict[str, Any]], int]:
+        data = log_file.read_bytes()
+        return self.codec.decode_log(data), len(data)
+
+    def _write_log_snapshot(self, session_id: str, history: list[dict[str, Any]]) -> None:
+        log_file = self._log_file(session_id)
+        data = self.codec.encode_record(history)
+        log_file.parent.mkdir(parents=True, exist_ok=True)
+        self._writer.write_atomic(log_file, data)
+        self._appends_since_compaction[session_id] = 0
+        self._cache.put(self._safe_session_id(session_id), history, len(data))
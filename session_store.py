@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from typing import Any
+
+
+class VersionConflictError(Exception):
+    """Raised when a history changed since the caller read it."""
+
+
+class SessionStore(ABC):
+    """Storage backend for chat histories and per-session metadata.
+
+    Metadata entries are dicts with ``id``, ``title``, ``updated_at`` and
+    ``preview`` string keys.
+
+    Histories only grow between deletes, so their length doubles as an
+    optimistic version number: writers pass the length they read as
+    ``expected_version`` and get :class:`VersionConflictError` if another
+    writer appended in between.
+    """
+
+    # True when get_history_range reads only the requested slice, so long
+    # histories can be streamed a page at a time.
+    ranged_history_reads = False
+
+    @abstractmethod
+    def session_exists(self, session_id: str) -> bool:
+        """Return True when the session has a stored history."""
+
+    @abstractmethod
+    def get_history(self, session_id: str) -> list[dict[str, Any]]:
+        """Return session history; [] if the session does not exist."""
+
+    def get_history_range(
+        self, session_id: str, offset: int = 0, limit: int | None = None
+    ) -> list[dict[str, Any]]:
+        """Return up to ``limit`` messages (all when None) starting at ``offset``.
+
+        Backends override this to avoid loading the whole history, and set
+        :attr:`ranged_history_reads` when they do.
+        """
+        stop = None if limit is None else offset + limit
+        return self.get_history(session_id)[offset:stop]
+
+    def history_length(self, session_id: str) -> int:
+        """Return the number of stored messages, i.e. the history version."""
+        return len(self.get_history(session_id))
+
+    def find_message(self, session_id: str, message_id: str) -> int | None:
+        """Return the position of the message with id ``message_id``, or None."""
+        for position, message in enumerate(self.get_history(session_id)):
+            if isinstance(message, dict) and message.get("id") == message_id:
+                return position
+        return None
+
+    @abstractmethod
+    def save_history(self, session_id: str, history: list[dict[str, Any]]) -> None:
+        """Replace the stored session history."""
+
+    @abstractmethod
+    def append_history(
+        self,
+        session_id: str,
+        messages: list[dict[str, Any]],
+        expected_version: int | None = None,
+    ) -> None:
+        """Append one turn (a list of messages) to the stored history."""
+
+    @abstractmethod
+    def delete_history(self, session_id: str) -> bool:
+        """Delete a session history. Returns True if deleted, False if absent."""
+
+    @abstractmethod
+    def list_metadata(self) -> list[dict[str, str]]:
+        """Return the metadata entries of all sessions, in no particular order."""
+
+    @abstractmethod
+    def list_recent_metadata(
+        self, limit: int | None = None, after: tuple[str, str] | None = None
+    ) -> list[dict[str, str]]:
+        """Return metadata entries ordered by ``(updated_at, id)``, newest first.
+
+        ``after`` is the ``(updated_at, id)`` key of the last entry of the
+        previous page; only entries strictly older than it are returned.
+        """
+
+    @abstractmethod
+    def list_metadata_by_id(
+        self, limit: int | None = None, after: str | None = None
+    ) -> list[dict[str, str]]:
+        """Return metadata entries ordered by id, only ids greater than ``after``.
+
+        Unlike the ``updated_at`` order this key never changes, so paging
+        through it visits every entry that exists throughout.
+        """
+
+    @abstractmethod
+    def iter_history_ids(self) -> Iterator[str]:
+        """Yield the ids stored histories are kept under, in no particular order.
+
+        These may be normalized forms of the ids callers used, and an id may
+        be yielded more than once.
+        """
+
+    @abstractmethod
+    def get_metadata(self, session_id: str) -> dict[str, str] | None:
+        """Return the metadata entry of one session, or None if there is none."""
+
+    @abstractmethod
+    def update_metadata(
+        self,
+        session_id: str,
+        title: str,
+        updated_at: str | None = None,
+        preview: str | None = None,
+    ) -> None:
+        """Create or update a metadata entry; None leaves a field unchanged."""
+
+    @abstractmethod
+    def delete_metadata(self, session_id: str) -> bool:
+        """Delete a metadata entry. Returns True if deleted, False if absent."""
+
+    def delete_history_many(self, session_ids: list[str]) -> int:
+        """Delete several session histories. Returns how many existed.
+
+        Backends override this to delete the batch concurrently or at once.
+        """
+        return sum(self.delete_history(session_id) for session_id in session_ids)
+
+    def delete_metadata_many(self, session_ids: list[str]) -> int:
+        """Delete several metadata entries in one batch. Returns how many existed.
+
+        Backends override this to write the batch at once.
+        """
+        return sum(self.delete_metadata(session_id) for session_id in session_ids)
+
+    def import_sessions(self, sessions: list[dict[str, Any]]) -> None:
+        """Replace a batch of sessions, each a dict with ``id``, ``history``
+        and ``metadata`` (a dict with ``title``, ``updated_at`` and
+        ``preview``, or None).
+
+        Backends override this to write the batch at once.
+        """
+        for session in sessions:
+            self.save_history(session["id"], session["history"])
+            metadata = session["metadata"]
+            if metadata is not None:
+                self.update_metadata(
+                    session["id"],
+                    str(metadata.get("title") or "New Session"),
+                    updated_at=str(metadata.get("updated_at", "")),
+                    preview=str(metadata.get("preview", "")),
+                )
+
+    @abstractmethod
+    def history_size(self, session_id: str) -> int:
+        """Return the bytes a session's stored history takes up."""
+
+    @abstractmethod
+    def get_summary(self, session_id: str) -> dict[str, Any] | None:
+        """Return the stored summary of a session, or None if there is none."""
+
+    @abstractmethod
+    def save_summary(self, session_id: str, summary: dict[str, Any]) -> None:
+        """Store the summary of a session's current history.
+
+        Writing the history any other way drops the summary, so a stored
+        summary always matches the history.
+        """
+
+    def save_turn(
+        self,
+        session_id: str,
+        messages: list[dict[str, Any]],
+        title: str,
+        updated_at: str | None = None,
+        preview: str | None = None,
+        expected_version: int | None = None,
+        summary: dict[str, Any] | None = None,
+    ) -> None:
+        """Append a turn and update the session metadata and summary.
+
+        Backends with transactions override this to make all writes atomic.
+        """
+        self.append_history(session_id, messages, expected_version=expected_version)
+        if summary is not None:
+            self.save_summary(session_id, summary)
+        self.update_metadata(session_id, title, updated_at=updated_at, preview=preview)
+
+    def history_id(self, session_id: str) -> str:
+        """Return the id the history of ``session_id`` is stored under.
+
+        Backends that normalize ids override this; see :meth:`iter_history_ids`.
+        """
+        return session_id
+
+    def cache_stats(self) -> dict[str, int]:
+        """Return counters of the backend's history cache, if it has one."""
+        return {}
+
+    def get_cached_title(self, key: str) -> str | None:
+        """Return the generated title cached under ``key``, or None.
+
+        Backends without a title cache always miss.
+        """
+        return None
+
+    def save_cached_title(self, key: str, title: str) -> None:
+        """Cache a generated title under ``key``, shared by every process
+        using this store; the least recently used titles are evicted beyond
+        the backend's bound."""
+
+    def close(self) -> None:
+        """Flush pending writes and release resources."""
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import json
+from typing import Any
+
+
+def message_text(message: dict[str, Any]) -> str:
+    """Return the text of a stored message from ``content`` or its first part."""
+    content = message.get("content")
+    if isinstance(content, str):
+        return content
+    parts = message.get("parts", [])
+    if isinstance(parts, list) and parts:
+        return "" if parts[0] is None else str(parts[0])
+    return ""
+
+
+def new_summary() -> dict[str, Any]:
+    return {
+        "user_answers": [],
+        "qa_pairs": [],
+        "status": "collecting",
+        "final_prompt": "",
+        "last_question": "",
+    }
+
+
+def add_turn(summary: dict[str, Any], user_answer: str, response: dict[str, Any]) -> dict[str, Any]:
+    """Return ``summary`` updated with one user answer and the model's reply.
+
+    The answer is paired with the question of the previous reply, so the first
+    message of a session (the user's goal) has an empty question.
+    """
+    status = response.get("status")
+    final_prompt = response.get("final_prompt")
+    question = response.get("question_text")
+    return {
+        "user_answers": [*summary["user_answers"], user_answer],
+        "qa_pairs": [
+            *summary["qa_pairs"],
+            {"question": summary["last_question"], "answer": user_answer},
+        ],
+        "status": status if isinstance(status, str) and status else summary["status"],
+        "final_prompt": final_prompt if isinstance(final_prompt, str) and final_prompt else summary["final_prompt"],
+        "last_question": question if isinstance(question, str) else "",
+    }
+
+
+def summary_text(summary: dict[str, Any]) -> str:
+    """Return the searchable text of a summary: answers, questions and final prompt."""
+    questions = [pair["question"] for pair in summary["qa_pairs"]]
+    return " ".join(
+        [*summary["user_answers"], *questions, summary["last_question"], summary["final_prompt"]]
+    )
+
+
+def summarize_history(history: list[dict[str, Any]]) -> dict[str, Any]:
+    """Build a summary from scratch, for sessions stored before summaries existed."""
+    summary = new_summary()
+    pending_answer: str | None = None
+    for message in history:
+        if not isinstance(message, dict):
+            continue
+        if message.get("role") == "user":
+            if pending_answer is not None:
+                summary = add_turn(summary, pending_answer, {})
+            pending_answer = message_text(message)
+            continue
+        try:
+            response = json.loads(message_text(message))
+        except ValueError:
+            response = None
+        if not isinstance(response, dict):
+            response = {}
+        if pending_answer is not None:
+            summary = add_turn(summary, pending_answer, response)
+            pending_answer = None
+        elif isinstance(response.get("question_text"), str):
+            summary["last_question"] = response["question_text"]
+    if pending_answer is not None:
+        summary = add_turn(summary, pending_answer, {})
+    return summary
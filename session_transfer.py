@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import json
+import zlib
+from collections.abc import Callable, Iterator
+from contextlib import ExitStack
+from typing import Any
+
+from session_locks import SessionLockManager
+from session_store import SessionStore
+
+EXPORT_FORMAT = "prompt-ai-sessions"
+EXPORT_VERSION = 1
+# Gzip container for zlib's compress/decompress objects.
+GZIP_WBITS = 31
+
+
+def iter_export(
+    store: SessionStore, page_size: int = 1000, report: dict[str, int] | None = None
+) -> Iterator[bytes]:
+    """Yield a gzip-compressed NDJSON export of every stored session.
+
+    The first line is a header; each further line holds one session's ``id``,
+    ``metadata`` and ``history``. Sessions with metadata are read one page at
+    a time in id order, a key that writes do not change, so every session
+    that exists throughout the export is included even while chats go on.
+    Histories without a metadata entry follow with ``metadata`` null. Memory
+    use does not grow with the number of sessions.
+
+    ``report``, if given, is filled with the number of ``sessions`` written,
+    of metadata entries skipped because their history was empty or
+    unreadable (``missing_history``), and of other histories skipped as
+    ``unreadable``.
+    """
+    counts = {"sessions": 0, "missing_history": 0, "unreadable": 0}
+    if report is not None:
+        report.update(counts)
+        counts = report
+    compressor = zlib.compressobj(6, zlib.DEFLATED, GZIP_WBITS)
+    yield compressor.compress(_encode({"format": EXPORT_FORMAT, "version": EXPORT_VERSION}))
+
+    # History ids of entries whose id the store normalizes; usually empty.
+    renamed: set[str] = set()
+    after: str | None = None
+    while True:
+        page = store.list_metadata_by_id(limit=page_size, after=after)
+        for entry in page:
+            session_id = entry["id"]
+            try:
+                history = store.get_history(session_id)
+                history_id = store.history_id(session_id)
+            except ValueError:
+                history = []
+            else:
+                if history_id != session_id:
+                    renamed.add(history_id)
+            if not history:
+                counts["missing_history"] += 1
+                continue
+            metadata = {key: entry[key] for key in ("title", "updated_at", "preview")}
+            chunk = compressor.compress(_encode({"id": session_id, "metadata": metadata, "history": history}))
+            counts["sessions"] += 1
+            if chunk:
+                yield chunk
+        if len(page) < page_size:
+            break
+        after = page[-1]["id"]
+
+    exported_orphans: set[str] = set()
+    for session_id in store.iter_history_ids():
+        if (
+            session_id in renamed
+            or session_id in exported_orphans
+            or store.get_metadata(session_id) is not None
+        ):
+            continue
+        try:
+            history = store.get_history(session_id)
+        except ValueError:
+            counts["unreadable"] += 1
+            continue
+        if not history:
+            continue
+        exported_orphans.add(session_id)
+        chunk = compressor.compress(_encode({"id": session_id, "metadata": None, "history": history}))
+        counts["sessions"] += 1
+        if chunk:
+            yield chunk
+    yield compressor.flush()
+
+
+class SessionImporter:
+    """Load an export produced by :func:`iter_export`, fed in arbitrary chunks.
+
+    Input is decompressed and split into lines incrementally, and sessions are
+    written ``batch_size`` at a time through
+    :meth:`SessionStore.import_sessions`, replacing sessions with the same id.
+    With ``locks`` the batch's session locks are held while it is written.
+    ``on_session`` is called with the id and history of every imported
+    session.
+    """
+
+    def __init__(
+        self,
+        store: SessionStore,
+        batch_size: int = 500,
+        locks: SessionLockManager | None = None,
+        on_session: Callable[[str, list[dict[str, Any]]], None] | None = None,
+    ) -> None:
+        self.store = store
+        self.batch_size = max(1, batch_size)
+        self.locks = locks
+        self.on_session = on_session
+        self.sessions = 0
+        self.messages = 0
+        self.skipped = 0
+        self._decompressor = zlib.decompressobj(GZIP_WBITS)
+        self._buffer = b""
+        self._batch: dict[str, dict[str, Any]] = {}
+
+    def feed(self, data: bytes) -> None:
+        while data:
+            # Bound the output per call so a small, highly compressed input
+            # cannot expand into one huge buffer.
+            self._add_text(self._decompressor.decompress(data, 1 << 20))
+            data = self._decompressor.unconsumed_tail
+
+    def finish(self) -> dict[str, int]:
+        """Write what is still buffered and return the import counts."""
+        self._add_text(self._decompressor.flush())
+        if self._buffer.strip():
+            self._add_line(self._buffer)
+        self._buffer = b""
+        self._write_batch()
+        return {"sessions": self.sessions, "messages": self.messages, "skipped": self.skipped}
+
+    def _add_text(self, text: bytes) -> None:
+        lines = (self._buffer + text).split(b"\n")
+        self._buffer = lines.pop()
+        for line in lines:
+            if line.strip():
+                self._add_line(line)
+
+    def _add_line(self, line: bytes) -> None:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            self.skipped += 1
+            return
+        if not isinstance(record, dict) or "format" in record:
+            return
+        session_id = record.get("id")
+        history = record.get("history")
+        metadata = record.get("metadata")
+        if not isinstance(session_id, str) or not session_id or not isinstance(history, list):
+            self.skipped += 1
+            return
+        self._batch[session_id] = {
+            "id": session_id,
+            "history": history,
+            "metadata": metadata if isinstance(metadata, dict) else None,
+        }
+        if len(self._batch) >= self.batch_size:
+            self._write_batch()
+
+    def _write_batch(self) -> None:
+        if not self._batch:
+            return
+        batch = list(self._batch.values())
+        self._batch = {}
+        with ExitStack() as stack:
+            if self.locks is not None:
+                # Sorted, like every holder of several session locks.
+                for session_id in sorted(session["id"] for session in batch):
+                    stack.enter_context(self.locks.lock(session_id))
+            self.store.import_sessions(batch)
+        for session in batch:
+            self.sessions += 1
+            self.messages += len(session["history"])
+            if self.on_session is not None:
+                self.on_session(session["id"], session["history"])
+
+
+def _encode(record: dict[str, Any]) -> bytes:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
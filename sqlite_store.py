@@ -0,0 +1,448 @@
+from __future__ import annotations
+
+import json
+import secrets
+import sqlite3
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+from session_store import SessionStore, VersionConflictError
+
+# PRAGMA synchronous level for each DurableWriter durability mode.
+SYNCHRONOUS_LEVELS = {"none": "OFF", "batch": "FULL", "always": "FULL"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    updated_at TEXT NOT NULL DEFAULT '',
+    preview TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_updated_at ON sessions (updated_at, id);
+CREATE TABLE IF NOT EXISTS messages (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    message TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS summaries (
+    session_id TEXT PRIMARY KEY,
+    summary TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS titles (
+    key TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    used_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_titles_used_at ON titles (used_at);
+CREATE TABLE IF NOT EXISTS changes (
+    session_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS changes_message_insert AFTER INSERT ON messages BEGIN
+    UPDATE changes SET version = version + 1 WHERE session_id = '';
+    INSERT INTO changes (session_id, version)
+    SELECT NEW.session_id, version FROM changes WHERE session_id = ''
+    ON CONFLICT (session_id) DO UPDATE SET version = excluded.version;
+END;
+CREATE TRIGGER IF NOT EXISTS changes_message_delete AFTER DELETE ON messages BEGIN
+    UPDATE changes SET version = version + 1 WHERE session_id = '';
+    UPDATE changes SET version = (SELECT version FROM changes WHERE session_id = '')
+    WHERE session_id = OLD.session_id;
+END;
+CREATE TRIGGER IF NOT EXISTS changes_session_insert AFTER INSERT ON sessions BEGIN
+    UPDATE changes SET version = version + 1 WHERE session_id = '';
+    INSERT INTO changes (session_id, version)
+    SELECT NEW.id, version FROM changes WHERE session_id = ''
+    ON CONFLICT (session_id) DO UPDATE SET version = excluded.version;
+END;
+CREATE TRIGGER IF NOT EXISTS changes_session_update AFTER UPDATE ON sessions BEGIN
+    UPDATE changes SET version = version + 1 WHERE session_id = '';
+    INSERT INTO changes (session_id, version)
+    SELECT NEW.id, version FROM changes WHERE session_id = ''
+    ON CONFLICT (session_id) DO UPDATE SET version = excluded.version;
+END;
+CREATE TRIGGER IF NOT EXISTS changes_session_delete AFTER DELETE ON sessions BEGIN
+    UPDATE changes SET version = version + 1 WHERE session_id = '';
+    DELETE FROM changes WHERE session_id = OLD.id;
+END;
+"""
+
+UPSERT_METADATA = """
+INSERT INTO sessions (id, title, updated_at, preview)
+VALUES (:id, :title, COALESCE(:updated_at, ''), COALESCE(:preview, ''))
+ON CONFLICT (id) DO UPDATE SET
+    title = excluded.title,
+    updated_at = COALESCE(:updated_at, sessions.updated_at),
+    preview = COALESCE(:preview, sessions.preview)
+"""
+
+
+class SqliteSessionStore(SessionStore):
+    """Store histories and metadata in one SQLite database in WAL mode.
+
+    Messages live in a ``messages`` table keyed by ``(session_id, seq)`` and
+    metadata in a ``sessions`` table, so a turn and its metadata update commit
+    in a single transaction. Each thread uses its own connection.
+
+    Generated titles are cached in a ``titles`` table of at most
+    ``title_cache_max_entries`` rows (0 disables it).
+
+    Triggers keep a ``changes`` table holding a counter bumped by every write
+    and, per session, the counter value at its last write. Being part of the
+    database, these versions are shared by every process using it.
+
+    ``durability`` takes the same modes as :class:`durable_io.DurableWriter`.
+    ``batch`` keeps its guarantee that an acknowledged write survives power
+    loss, so it maps to ``synchronous=FULL`` like ``always``; ``NORMAL`` would
+    only sync the WAL at checkpoints.
+    """
+
+    ranged_history_reads = True
+
+    def __init__(
+        self,
+        db_path: str | Path = "sessions/sessions.db",
+        durability: str = "batch",
+        title_cache_max_entries: int = 10_000,
+    ) -> None:
+        if durability not in SYNCHRONOUS_LEVELS:
+            raise ValueError(f"durability must be one of {', '.join(SYNCHRONOUS_LEVELS)}")
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.durability = durability
+        self.title_cache_max_entries = max(0, title_cache_max_entries)
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._conn().executescript(SCHEMA)
+        with self._transaction() as conn:
+            # A random start keeps versions of a recreated database from
+            # matching ones handed out before.
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO changes (session_id, version) VALUES ('', ?)",
+                (secrets.randbits(48),),
+            )
+            if cursor.rowcount:
+                conn.execute(
+                    "INSERT OR IGNORE INTO changes (session_id, version) "
+                    "SELECT id, (SELECT version FROM changes WHERE session_id = '') FROM "
+                    "(SELECT id FROM sessions UNION SELECT session_id FROM messages)"
+                )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Each thread uses only its own connection; the flag lets close()
+            # release them from whichever thread shuts the store down.
+            conn = sqlite3.connect(
+                self.db_path, isolation_level=None, timeout=30.0, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={SYNCHRONOUS_LEVELS[self.durability]}")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self) -> None:
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def session_exists(self, session_id: str) -> bool:
+        row = self._conn().execute(
+            "SELECT 1 FROM messages WHERE session_id = ? LIMIT 1", (session_id,)
+        ).fetchone()
+        return row is not None
+
+    def get_history(self, session_id: str) -> list[dict[str, Any]]:
+        rows = self._conn().execute(
+            "SELECT message FROM messages WHERE session_id = ? ORDER BY seq", (session_id,)
+        )
+        return [json.loads(message) for (message,) in rows]
+
+    def get_history_range(
+        self, session_id: str, offset: int = 0, limit: int | None = None
+    ) -> list[dict[str, Any]]:
+        rows = self._conn().execute(
+            "SELECT message FROM messages WHERE session_id = ? AND seq >= ? ORDER BY seq LIMIT ?",
+            (session_id, offset, -1 if limit is None else limit),
+        )
+        return [json.loads(message) for (message,) in rows]
+
+    def history_length(self, session_id: str) -> int:
+        (length,) = self._conn().execute(
+            "SELECT COALESCE(MAX(seq) + 1, 0) FROM messages WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return length
+
+    def find_message(self, session_id: str, message_id: str) -> int | None:
+        row = self._conn().execute(
+            "SELECT seq FROM messages WHERE session_id = ? AND json_extract(message, '$.id') = ? "
+            "ORDER BY seq LIMIT 1",
+            (session_id, message_id),
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def save_history(self, session_id: str, history: list[dict[str, Any]]) -> None:
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM summaries WHERE session_id = ?", (session_id,))
+            self._insert_messages(conn, session_id, history, start=0)
+
+    def append_history(
+        self,
+        session_id: str,
+        messages: list[dict[str, Any]],
+        expected_version: int | None = None,
+    ) -> None:
+        with self._transaction() as conn:
+            self._append_messages(conn, session_id, messages, expected_version)
+            conn.execute("DELETE FROM summaries WHERE session_id = ?", (session_id,))
+
+    def delete_history(self, session_id: str) -> bool:
+        with self._transaction() as conn:
+            cursor = conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM summaries WHERE session_id = ?", (session_id,))
+        return cursor.rowcount > 0
+
+    def list_metadata(self) -> list[dict[str, str]]:
+        rows = self._conn().execute("SELECT id, title, updated_at, preview FROM sessions")
+        return [_metadata_row(row) for row in rows]
+
+    def list_recent_metadata(
+        self, limit: int | None = None, after: tuple[str, str] | None = None
+    ) -> list[dict[str, str]]:
+        query = "SELECT id, title, updated_at, preview FROM sessions"
+        params: list[Any] = []
+        if after is not None:
+            query += " WHERE (updated_at, id) < (?, ?)"
+            params.extend(after)
+        query += " ORDER BY updated_at DESC, id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        return [_metadata_row(row) for row in self._conn().execute(query, params)]
+
+    def list_metadata_by_id(
+        self, limit: int | None = None, after: str | None = None
+    ) -> list[dict[str, str]]:
+        query = "SELECT id, title, updated_at, preview FROM sessions"
+        params: list[Any] = []
+        if after is not None:
+            query += " WHERE id > ?"
+            params.append(after)
+        query += " ORDER BY id"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        return [_metadata_row(row) for row in self._conn().execute(query, params)]
+
+    def iter_history_ids(self, page_size: int = 1000) -> Iterator[str]:
+        # Keyset pages rather than one open cursor, so no read transaction
+        # stays open between yields (which may happen on different threads).
+        after = ""
+        while True:
+            page = [
+                session_id
+                for (session_id,) in self._conn().execute(
+                    "SELECT DISTINCT session_id FROM messages WHERE session_id > ?"
+                    " ORDER BY session_id LIMIT ?",
+                    (after, page_size),
+                )
+            ]
+            yield from page
+            if len(page) < page_size:
+                return
+            after = page[-1]
+
+    def get_metadata(self, session_id: str) -> dict[str, str] | None:
+        row = self._conn().execute(
+            "SELECT id, title, updated_at, preview FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        return None if row is None else _metadata_row(row)
+
+    def update_metadata(
+        self,
+        session_id: str,
+        title: str,
+        updated_at: str | None = None,
+        preview: str | None = None,
+    ) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                UPSERT_METADATA,
+                {"id": session_id, "title": title, "updated_at": updated_at, "preview": preview},
+            )
+
+    def delete_metadata(self, session_id: str) -> bool:
+        with self._transaction() as conn:
+            cursor = conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+        return cursor.rowcount > 0
+
+    def delete_history_many(self, session_ids: list[str]) -> int:
+        deleted = 0
+        with self._transaction() as conn:
+            for session_id in session_ids:
+                cursor = conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+                conn.execute("DELETE FROM summaries WHERE session_id = ?", (session_id,))
+                deleted += cursor.rowcount > 0
+        return deleted
+
+    def delete_metadata_many(self, session_ids: list[str]) -> int:
+        with self._transaction() as conn:
+            cursor = conn.executemany(
+                "DELETE FROM sessions WHERE id = ?", [(session_id,) for session_id in session_ids]
+            )
+        return cursor.rowcount
+
+    def import_sessions(self, sessions: list[dict[str, Any]]) -> None:
+        """Replace a batch of sessions in one transaction."""
+        with self._transaction() as conn:
+            for session in sessions:
+                conn.execute("DELETE FROM messages WHERE session_id = ?", (session["id"],))
+                conn.execute("DELETE FROM summaries WHERE session_id = ?", (session["id"],))
+                self._insert_messages(conn, session["id"], session["history"], start=0)
+                metadata = session["metadata"]
+                if metadata is not None:
+                    conn.execute(
+                        UPSERT_METADATA,
+                        {
+                            "id": session["id"],
+                            "title": str(metadata.get("title") or "New Session"),
+                            "updated_at": str(metadata.get("updated_at", "")),
+                            "preview": str(metadata.get("preview", "")),
+                        },
+                    )
+
+    def change_version(self, session_id: str = "") -> int:
+        """Return the version of the last write to ``session_id``; "" means any session."""
+        row = self._conn().execute(
+            "SELECT version FROM changes WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return 0 if row is None else row[0]
+
+    def history_size(self, session_id: str) -> int:
+        (size,) = self._conn().execute(
+            "SELECT COALESCE(SUM(LENGTH(message)), 0) FROM messages WHERE session_id = ?",
+            (session_id,),
+        ).fetchone()
+        return size
+
+    def get_summary(self, session_id: str) -> dict[str, Any] | None:
+        row = self._conn().execute(
+            "SELECT summary FROM summaries WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def save_summary(self, session_id: str, summary: dict[str, Any]) -> None:
+        with self._transaction() as conn:
+            self._upsert_summary(conn, session_id, summary)
+
+    def get_cached_title(self, key: str) -> str | None:
+        if not self.title_cache_max_entries:
+            return None
+        conn = self._conn()
+        row = conn.execute("SELECT title FROM titles WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE titles SET used_at = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def save_cached_title(self, key: str, title: str) -> None:
+        if not self.title_cache_max_entries:
+            return
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO titles (key, title, used_at) VALUES (?, ?, ?)",
+                (key, title, time.time()),
+            )
+            conn.execute(
+                "DELETE FROM titles WHERE key IN (SELECT key FROM titles ORDER BY used_at"
+                " LIMIT MAX(0, (SELECT COUNT(*) FROM titles) - ?))",
+                (self.title_cache_max_entries,),
+            )
+
+    def save_turn(
+        self,
+        session_id: str,
+        messages: list[dict[str, Any]],
+        title: str,
+        updated_at: str | None = None,
+        preview: str | None = None,
+        expected_version: int | None = None,
+        summary: dict[str, Any] | None = None,
+    ) -> None:
+        """Append a turn and update the session metadata and summary in one transaction."""
+        with self._transaction() as conn:
+            self._append_messages(conn, session_id, messages, expected_version)
+            if summary is None:
+                conn.execute("DELETE FROM summaries WHERE session_id = ?", (session_id,))
+            else:
+                self._upsert_summary(conn, session_id, summary)
+            conn.execute(
+                UPSERT_METADATA,
+                {"id": session_id, "title": title, "updated_at": updated_at, "preview": preview},
+            )
+
+    def _append_messages(
+        self,
+        conn: sqlite3.Connection,
+        session_id: str,
+        messages: list[dict[str, Any]],
+        expected_version: int | None,
+    ) -> None:
+        # seq values are contiguous from 0, so the next seq is the history length.
+        (next_seq,) = conn.execute(
+            "SELECT COALESCE(MAX(seq) + 1, 0) FROM messages WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if expected_version is not None and next_seq != expected_version:
+            raise VersionConflictError(
+                f"Session {session_id} is at version {next_seq}, expected {expected_version}"
+            )
+        self._insert_messages(conn, session_id, messages, start=next_seq)
+
+    def _upsert_summary(
+        self, conn: sqlite3.Connection, session_id: str, summary: dict[str, Any]
+    ) -> None:
+        conn.execute(
+            "INSERT OR REPLACE INTO summaries (session_id, summary) VALUES (?, ?)",
+            (session_id, json.dumps(summary, ensure_ascii=False)),
+        )
+
+    def _insert_messages(
+        self,
+        conn: sqlite3.Connection,
+        session_id: str,
+        messages: list[dict[str, Any]],
+        start: int,
+    ) -> None:
+        conn.executemany(
+            "INSERT INTO messages (session_id, seq, message) VALUES (?, ?, ?)",
+            [
+                (session_id, start + i, json.dumps(message, ensure_ascii=False))
+                for i, message in enumerate(messages)
+            ],
+        )
+
+
+def _metadata_row(row: tuple[str, str, str, str]) -> dict[str, str]:
+    session_id, title, updated_at, preview = row
+    return {"id": session_id, "title": title, "updated_at": updated_at, "preview": preview}